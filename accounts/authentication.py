@@ -0,0 +1,109 @@
+"""
+Authentication classes for accounts app.
+"""
+
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+from core.models import User
+
+
+class UserCache:
+    """
+    Cache of the user fields that authentication and permissions read.
+
+    Entries live in a small per-process dict for `local_timeout` seconds
+    and in the Django cache (Redis in production) for `timeout` seconds.
+    `invalidate` clears both in the calling process; other processes keep
+    their local entry until it expires, so `local_timeout` bounds how long
+    a change (e.g. a deactivation) can go unnoticed.
+
+    Only `fields` are loaded on the users it returns; every other field is
+    deferred and costs a query on first access, and `save()` only writes
+    the loaded fields and those assigned since. Views that read or save
+    other fields should load the user with `User.objects.get` first.
+    """
+
+    # In model field order, as expected by Model.from_db
+    fields = tuple(
+        field.attname
+        for field in User._meta.concrete_fields
+        if field.attname
+        in (
+            "uid",
+            "email",
+            "first_name",
+            "last_name",
+            "is_active",
+            "is_staff",
+            "is_superuser",
+            "is_email_verified",
+        )
+    )
+
+    def __init__(self, timeout: int = 60, local_timeout: float = 5):
+        self.timeout = timeout
+        self.local_timeout = local_timeout
+        self.local = {}
+        self.lock = threading.Lock()
+
+    def get(self, user_id):
+        """Return a User with the cached fields loaded, or None"""
+        key = self._key(user_id)
+        entry = self.local.get(key)
+        if entry and entry[0] > time.monotonic():
+            values = entry[1]
+        else:
+            values = cache.get(key)
+            if values is None:
+                return None
+            self._set_local(key, values)
+
+        # Fields left out of the cache are deferred and load on access
+        return User.from_db(DEFAULT_DB_ALIAS, self.fields, values)
+
+    def set(self, user):
+        key = self._key(user.pk)
+        values = tuple(getattr(user, field) for field in self.fields)
+        cache.set(key, values, timeout=self.timeout)
+        self._set_local(key, values)
+
+    def invalidate(self, user_id):
+        key = self._key(user_id)
+        cache.delete(key)
+        with self.lock:
+            self.local.pop(key, None)
+
+    def _set_local(self, key, values):
+        with self.lock:
+            self.local[key] = (time.monotonic() + self.local_timeout, values)
+
+    def _key(self, user_id):
+        return f"auth-user:{user_id}"
+
+
+user_cache = UserCache()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that reads the user from `user_cache`, saving the
+    user query on most authenticated requests.
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None or api_settings.CHECK_REVOKE_TOKEN:
+            # Revocation checks need the password hash, which is not cached
+            return super().get_user(validated_token)
+
+        user = user_cache.get(user_id)
+        if user is None:
+            user = super().get_user(validated_token)
+            user_cache.set(user)
+        return user
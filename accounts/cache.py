@@ -0,0 +1,22 @@
+"""
+Response caches of the accounts endpoints.
+"""
+
+import time
+
+from django.conf import settings
+
+from utils.cache import ResponseCache
+
+# Profiles carry presigned avatar URLs, valid for AWS_QUERYSTRING_EXPIRE
+# seconds. Cached profiles and their ETags are renewed every quarter of
+# that, so a served URL is always valid for at least three quarters of it.
+PROFILE_WINDOW = getattr(settings, "AWS_QUERYSTRING_EXPIRE", 3600) // 4
+
+# Rendered user profiles, invalidated by accounts.signals on user changes
+profile_responses = ResponseCache("profile", timeout=PROFILE_WINDOW)
+
+
+def get_profile_window() -> int:
+    """Index of the current window, embedded in profile keys and ETags"""
+    return int(time.time() // PROFILE_WINDOW)
@@ -7,7 +7,15 @@ from django.core.exceptions import ValidationError
 from django.core.validators import EmailValidator
 from django.db import transaction
 from rest_framework import serializers
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import (
+    TokenObtainPairSerializer,
+    TokenRefreshSerializer,
+)
+from rest_framework_simplejwt.settings import api_settings
+from accounts.authentication import CachedJWTAuthentication
+from accounts.tasks import send_welcome_email
+from accounts.tokens import StoredRefreshToken, refresh_tokens
 from utils.exceptions import (
     AuthFailureException,
     TokenInvalidException,
@@ -32,12 +40,13 @@ class AuthSerializer(serializers.Serializer):
         return instance.get_avatar_url
 
     class Meta:
-        token_class = RefreshToken
+        token_class = StoredRefreshToken
 
     def to_representation(self, instance):
         if not isinstance(instance, User):
             raise AuthFailureException
         token = self.Meta.token_class.for_user(instance)
+        refresh_tokens.record_login(instance.pk)
         return {
             "refresh": str(token),
             "access": str(token.access_token),
@@ -48,6 +57,46 @@ class AuthSerializer(serializers.Serializer):
         }
 
 
+class StoredTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Issue refresh tokens tracked by the refresh token store"""
+
+    token_class = StoredRefreshToken
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        refresh_tokens.record_login(self.user.pk)
+        return data
+
+
+class StoredTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Rotate refresh tokens through the refresh token store, without
+    database writes and with the user read from the user cache
+    """
+
+    token_class = StoredRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs["refresh"])
+        # Raises for unknown or inactive users
+        CachedJWTAuthentication().get_user(refresh)
+
+        data = {"access": str(refresh.access_token)}
+
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if not refresh_tokens.consume(refresh):
+                # Already rotated by a concurrent request
+                raise InvalidToken("Token is invalid or expired")
+
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            refresh_tokens.add(refresh)
+            data["refresh"] = str(refresh)
+
+        return data
+
+
 class BaseSignupSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -88,16 +137,16 @@ class BaseSignupSerializer(serializers.ModelSerializer):
     @transaction.atomic
     def create(self, validated_data):
         """Creates the User, NB: Password validation happens on the model level"""
-        user = User.objects.create_user(**validated_data)
+        # Users are verified and active on signup, saved in a single INSERT
+        user = User.objects.create_user(
+            **validated_data, is_email_verified=True, is_active=True
+        )
         transaction.on_commit(lambda: self.complete_account_signup(user))
         return user
 
     def complete_account_signup(self, user: User):
-        # Automatically verify email and make user active
-        user.is_email_verified = True
-        user.is_active = True
-        user.save()
-        user.send_welcome_email()
+        # Rendering and sending happen in a worker, not in the request
+        send_welcome_email.delay(str(user.pk))
 
 
 class AccountSignupSerializer(BaseSignupSerializer):
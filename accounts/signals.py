@@ -1,3 +1,18 @@
 """
 Signals for accounts app.
 """
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import User
+from .authentication import user_cache
+from .cache import profile_responses
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """Drop the cached authentication fields and profile of a changed user"""
+    user_cache.invalidate(instance.pk)
+    profile_responses.invalidate(instance.pk)
@@ -0,0 +1,28 @@
+"""
+Celery tasks for accounts app.
+"""
+
+from smtplib import SMTPException
+
+from config.celery import app
+from django.contrib.auth import get_user_model
+
+from .tokens import refresh_tokens
+
+
+@app.task
+def flush_last_logins() -> int:
+    """Write logins buffered in Redis to `User.last_login`"""
+    return refresh_tokens.flush_last_logins()
+
+
+@app.task(
+    autoretry_for=(SMTPException, OSError),
+    retry_backoff=True,
+    max_retries=3,
+)
+def send_welcome_email(user_id: str) -> None:
+    """Send the welcome email of a newly signed up user"""
+    user = get_user_model().objects.filter(pk=user_id).first()
+    if user is not None:
+        user.send_welcome_email()
@@ -1,9 +1,17 @@
 from utils.factories import UserFactory
 from utils.helpers import TestCaseHelper
 import pytest
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from accounts.cache import PROFILE_WINDOW
 from rest_framework import status
 
+from accounts.authentication import user_cache
+from core.models import User
+from accounts.tasks import flush_last_logins
+from accounts.tokens import StoredRefreshToken, refresh_tokens
 from accounts.serializers import AccountSignupSerializer
 
 login_url = "/api/v1/accounts/auth/login/"
@@ -77,6 +85,38 @@ class TestUserAuth(TestCaseHelper):
         self.client.logout()
 
 
+class TestSignup(TestCaseHelper):
+    def test_signup_single_insert_and_welcome_email_after_commit(
+        self, email_mocker
+    ):
+        data = {
+            "email": "new.driver@example.com",
+            "password": "ValidPassword123!",
+            "first_name": "new",
+            "last_name": "driver",
+        }
+
+        serializer = AccountSignupSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as queries:
+                user = serializer.save()
+            email_mocker.assert_not_called()
+
+        user_writes = [
+            query["sql"].split()[0]
+            for query in queries.captured_queries
+            if 'core_user"' in query["sql"].split("(")[0]
+            and not query["sql"].startswith("SELECT")
+        ]
+        self.assertEqual(user_writes, ["INSERT"])
+
+        email_mocker.assert_called_once()
+        user.refresh_from_db()
+        self.assertTrue(user.is_email_verified)
+        self.assertTrue(user.is_active)
+
+
 class TestSignupPasswordValidation(TestCaseHelper):
     def test_signup_with_invalidated_password_min_length(self, client):
         """Test a user can not signup with less than min password"""
@@ -150,3 +190,163 @@ class TestProfile(TestCaseHelper):
         self.assertEqual(response.status_code, 200)
         test_user.refresh_from_db()
         self.assertEqual(test_user.first_name, "NewName")
+
+    def test_profile_get_does_not_write(self, test_user):
+        updated_at = test_user.updated_at
+        client = self.get_authenticated_client(test_user)
+
+        first = client.get(profile_url)
+        response = client.get(profile_url, HTTP_IF_NONE_MATCH=first["ETag"])
+
+        self.assertEqual(response.status_code, 304)
+        test_user.refresh_from_db()
+        self.assertEqual(test_user.updated_at, updated_at)
+
+    def test_profile_update_invalidates_cached_profile(self, test_user):
+        client = self.get_authenticated_client(test_user)
+        etag = client.get(profile_url)["ETag"]
+
+        client.patch(profile_url, {"first_name": "NewName"})
+        response = client.get(profile_url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["data"]["first_name"], "NewName")
+
+
+    def test_profile_renewed_before_avatar_url_expires(self, test_user, mocker):
+        client = self.get_authenticated_client(test_user)
+        now = mocker.patch("accounts.cache.time.time", return_value=0)
+        etag = client.get(profile_url)["ETag"]
+
+        # Still within the window: the client's copy is current
+        now.return_value = PROFILE_WINDOW - 1
+        response = client.get(profile_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # Next window: rebuilt with freshly signed URLs
+        now.return_value = PROFILE_WINDOW
+        response = client.get(profile_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+
+class TestCachedAuthentication(TestCaseHelper):
+    def test_user_cached_after_first_request(self, test_user):
+        client = self.get_authenticated_client(test_user)
+        client.get("/api/v1/eld/trips/")
+
+        cached = user_cache.get(test_user.pk)
+        self.assertEqual(cached.email, test_user.email)
+        self.assertTrue(cached.is_email_verified)
+
+    def test_cached_user_defers_uncached_fields(self, test_user):
+        user_cache.set(test_user)
+        cached = user_cache.get(test_user.pk)
+
+        deferred = cached.get_deferred_fields()
+        self.assertIn("password", deferred)
+        self.assertFalse(deferred & set(user_cache.fields))
+
+        # Saving writes the loaded fields only, never a deferred one
+        User.objects.filter(pk=test_user.pk).update(address="Elsewhere")
+        cached.first_name = "Renamed"
+        with CaptureQueriesContext(connection) as queries:
+            cached.save()
+        updates = [
+            query["sql"] for query in queries if query["sql"].startswith("UPDATE")
+        ]
+        self.assertEqual(len(updates), 1)
+        self.assertFalse("address" in updates[0])
+        test_user.refresh_from_db()
+        self.assertEqual(test_user.address, "Elsewhere")
+        self.assertEqual(test_user.first_name, "Renamed")
+
+    def test_deactivation_invalidates_cached_user(self, test_user):
+        client = self.get_authenticated_client(test_user)
+        self.assertEqual(client.get("/api/v1/eld/trips/").status_code, 200)
+
+        test_user.is_active = False
+        test_user.save()
+
+        assert user_cache.get(test_user.pk) is None
+        self.assertEqual(client.get("/api/v1/eld/trips/").status_code, 401)
+
+
+class TestRefreshTokens(TestCaseHelper):
+    refresh_url = "/token/refresh/"
+
+    def test_refresh_rotates_token(self, test_user):
+        refresh = str(StoredRefreshToken.for_user(test_user))
+
+        response = self.client.post(self.refresh_url, {"refresh": refresh})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.data["refresh"], refresh)
+
+        # The rotated token cannot be used again
+        response = self.client.post(self.refresh_url, {"refresh": refresh})
+        self.assertEqual(response.status_code, 401)
+
+    def test_password_change_revokes_refresh_tokens(self, test_user):
+        refresh = str(StoredRefreshToken.for_user(test_user))
+
+        test_user.update_password("NewValidPassword123")
+
+        response = self.client.post(self.refresh_url, {"refresh": refresh})
+        self.assertEqual(response.status_code, 401)
+        new_refresh = str(StoredRefreshToken.for_user(test_user))
+        response = self.client.post(self.refresh_url, {"refresh": new_refresh})
+        self.assertEqual(response.status_code, 200)
+
+    def test_logout_revokes_posted_refresh_token(self, test_user):
+        refresh = str(StoredRefreshToken.for_user(test_user))
+        other_device = str(StoredRefreshToken.for_user(test_user))
+        client = self.get_authenticated_client(test_user)
+
+        response = client.post(logout_url, {"refresh": refresh})
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.post(self.refresh_url, {"refresh": refresh})
+        self.assertEqual(response.status_code, 401)
+        response = self.client.post(self.refresh_url, {"refresh": other_device})
+        self.assertEqual(response.status_code, 200)
+
+    def test_logout_without_token_revokes_every_refresh_token(self, test_user):
+        refresh = str(StoredRefreshToken.for_user(test_user))
+        client = self.get_authenticated_client(test_user)
+
+        self.assertEqual(client.get(logout_url).status_code, 200)
+
+        response = self.client.post(self.refresh_url, {"refresh": refresh})
+        self.assertEqual(response.status_code, 401)
+
+    def test_revoked_tokens_stay_revoked_when_generation_is_evicted(
+        self, test_user
+    ):
+        refresh = str(StoredRefreshToken.for_user(test_user))
+        refresh_tokens.revoke_user(test_user.pk)
+
+        cache.delete(refresh_tokens._generation_key(test_user.pk))
+
+        response = self.client.post(self.refresh_url, {"refresh": refresh})
+        self.assertEqual(response.status_code, 401)
+        # Neither does a new generation bring them back
+        new_refresh = str(StoredRefreshToken.for_user(test_user))
+        response = self.client.post(self.refresh_url, {"refresh": refresh})
+        self.assertEqual(response.status_code, 401)
+        response = self.client.post(self.refresh_url, {"refresh": new_refresh})
+        self.assertEqual(response.status_code, 200)
+
+    def test_last_login_written_back_in_bulk(self, test_user, settings, mocker):
+        connection = mocker.Mock()
+        connection.pipeline.return_value.execute.return_value = [
+            {str(test_user.pk): "1700000000.0"},
+            1,
+        ]
+        settings.REDIS_CONNECTION_INSTANCE = connection
+
+        refresh_tokens.record_login(test_user.pk)
+        self.assertEqual(flush_last_logins(), 1)
+
+        connection.hset.assert_called_once()
+        test_user.refresh_from_db()
+        self.assertEqual(test_user.last_login.timestamp(), 1700000000.0)
@@ -0,0 +1,379 @@
+"""
+Tests for accounts emails.
+"""
+
+import json
+from io import StringIO
+from smtplib import SMTPRecipientsRefused, SMTPServerDisconnected
+
+import pynliner
+import pytest
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail import EmailMessage
+from django.core.management import call_command
+from accounts.emails import AccountWelcomeEmail
+from config.celery import app, warm_email_templates
+from utils.emails import BaseEmail, get_email_template
+from utils.factories import UserFactory
+from utils.helpers import TestCaseHelper
+from utils.tasks.emails import (
+    FAILED_EMAILS_KEY,
+    drain_emails,
+    send_bulk_email_using_ses,
+    send_emails,
+)
+from utils.throttles import SendRateLimiter
+
+
+@pytest.mark.django_db
+class TestQueuedEmails(TestCaseHelper):
+    def test_send_email_goes_through_email_queue(self, mailoutbox, mocker):
+        delay = mocker.spy(send_emails, "delay")
+        user = UserFactory.create()
+
+        AccountWelcomeEmail(user).send_email()
+
+        delay.assert_called_once()
+        self.assertEqual(len(mailoutbox), 1)
+        self.assertEqual(mailoutbox[0].to, [user.email])
+        self.assertEqual(mailoutbox[0].content_subtype, "html")
+
+    def test_emails_sent_in_batches_over_one_connection(
+        self, mailoutbox, mocker, settings
+    ):
+        settings.EMAIL_BATCH_SIZE = 2
+        get_connection = mocker.patch(
+            "utils.tasks.emails.get_connection",
+            wraps=mail.get_connection,
+        )
+        users = UserFactory.create_batch(3)
+
+        BaseEmail.send_emails(AccountWelcomeEmail(user) for user in users)
+
+        self.assertEqual(get_connection.call_count, 2)
+        self.assertEqual(
+            sorted(email.to[0] for email in mailoutbox),
+            sorted(user.email for user in users),
+        )
+
+    def test_failed_email_retried_without_the_rest_of_its_batch(
+        self, mailoutbox, mocker
+    ):
+        send = EmailMessage.send
+        failures = [SMTPServerDisconnected("Connection lost")]
+
+        def flaky_send(message, *args, **kwargs):
+            if len(mailoutbox) == 1 and failures:
+                raise failures.pop()
+            return send(message, *args, **kwargs)
+
+        mocker.patch.object(EmailMessage, "send", flaky_send)
+        retry = mocker.spy(send_emails, "retry")
+        users = UserFactory.create_batch(3)
+
+        BaseEmail.send_emails(AccountWelcomeEmail(user) for user in users)
+
+        # The third email is sent before the second one is retried alone
+        self.assertEqual(
+            [email.to[0] for email in mailoutbox],
+            [users[0].email, users[2].email, users[1].email],
+        )
+        self.assertEqual(retry.call_count, 1)
+
+    def test_refused_recipient_set_aside_without_retrying(
+        self, mailoutbox, mocker, settings
+    ):
+        settings.CELERY_TASK_DEFAULT_QUEUE_DECLARE_DLX = False
+        send = EmailMessage.send
+        users = UserFactory.create_batch(2)
+
+        def refusing_send(message, *args, **kwargs):
+            if message.to == [users[0].email]:
+                raise SMTPRecipientsRefused({users[0].email: (550, b"No")})
+            return send(message, *args, **kwargs)
+
+        mocker.patch.object(EmailMessage, "send", refusing_send)
+        retry = mocker.spy(send_emails, "retry")
+        store = mocker.patch("utils.tasks.emails.store_failed_emails")
+
+        BaseEmail.send_emails(AccountWelcomeEmail(user) for user in users)
+
+        self.assertEqual([email.to for email in mailoutbox], [[users[1].email]])
+        self.assertEqual(retry.call_count, 0)
+        self.assertEqual(store.call_args.args[0][0]["to"], [users[0].email])
+
+    def test_refused_email_dead_lettered_on_amqp(self, mocker, settings):
+        settings.CELERY_TASK_DEFAULT_QUEUE_DECLARE_DLX = True
+        mocker.patch.object(
+            EmailMessage,
+            "send",
+            side_effect=SMTPRecipientsRefused({"a@example.com": (550, b"No")}),
+        )
+        send_task = mocker.patch.object(app, "send_task")
+        user = UserFactory.create()
+
+        BaseEmail.send_emails([AccountWelcomeEmail(user)])
+
+        self.assertEqual(send_task.call_args.args[0], "Send Emails")
+        self.assertEqual(send_task.call_args.kwargs["routing_key"], "dlx.emails")
+        self.assertEqual(
+            send_task.call_args.kwargs["args"][0][0]["to"], [user.email]
+        )
+
+    def test_emails_buffered_and_drained_in_batches(
+        self, mailoutbox, mocker, settings
+    ):
+        connection = settings.REDIS_CONNECTION_INSTANCE = mocker.Mock()
+        connection.set.side_effect = [True, None]
+        drain = mocker.patch.object(drain_emails, "apply_async")
+        users = UserFactory.create_batch(2)
+
+        for user in users:
+            AccountWelcomeEmail(user).send_email()
+
+        # Only the first email schedules the drain
+        drain.assert_called_once_with(countdown=settings.EMAIL_DRAIN_DELAY)
+        buffered = [call.args[1] for call in connection.rpush.call_args_list]
+        self.assertEqual(len(buffered), 2)
+        self.assertEqual(len(mailoutbox), 0)
+
+        connection.pipeline.return_value.execute.return_value = [buffered, 1]
+        delay = mocker.spy(send_emails, "delay")
+        self.assertEqual(drain_emails(), 2)
+
+        delay.assert_called_once()
+        self.assertEqual(
+            [email.to[0] for email in mailoutbox], [user.email for user in users]
+        )
+
+    def test_exhausted_emails_kept_in_failed_store_without_dlx(
+        self, mocker, settings
+    ):
+        settings.CELERY_TASK_DEFAULT_QUEUE_DECLARE_DLX = False
+        connection = settings.REDIS_CONNECTION_INSTANCE = mocker.Mock()
+        mocker.patch.object(send_emails, "max_retries", 0)
+        mocker.patch.object(
+            EmailMessage, "send", side_effect=SMTPServerDisconnected("Down")
+        )
+        user = UserFactory.create()
+
+        BaseEmail.send_emails([AccountWelcomeEmail(user)])
+
+        key, stored = connection.rpush.call_args.args
+        self.assertEqual(key, FAILED_EMAILS_KEY)
+        self.assertEqual(json.loads(stored)["to"], [user.email])
+
+    def test_failed_emails_requeued(self, mailoutbox, mocker, settings):
+        user = UserFactory.create()
+        email = AccountWelcomeEmail(user).get_queued_email()
+        connection = settings.REDIS_CONNECTION_INSTANCE = mocker.Mock()
+        connection.pipeline.return_value.execute.return_value = [
+            [json.dumps(email)],
+            1,
+        ]
+
+        call_command("requeue_failed_emails", stdout=StringIO())
+
+        connection.pipeline.return_value.lrange.assert_called_once_with(
+            FAILED_EMAILS_KEY, 0, -1
+        )
+        self.assertEqual(mailoutbox[0].to, [user.email])
+
+
+class TestEmailTemplates:
+    def test_template_css_inlined_and_compiled_once(self, mocker):
+        get_email_template.cache_clear()
+        inline = mocker.spy(pynliner, "fromString")
+        context = {"first_name": "Jane", "user_login_url": "/login/"}
+
+        first = get_email_template("emails/accounts/welcomeEmail.html")
+        html = first.render(context)
+        second = get_email_template("emails/accounts/welcomeEmail.html")
+
+        assert second is first
+        assert inline.call_count == 1
+        assert 'class="header" style="' in html
+        assert "Jane" in html
+
+    def test_style_blocks_kept_for_send_time_classes(self):
+        html = get_email_template(
+            "emails/accounts/general_notification.html"
+        ).render({"notification_type": "warning", "message": "Check"})
+
+        assert "<style" in html
+        assert "notification-box warning" in html
+
+
+class TestSendRateLimiter:
+    """Test the rate limit shared by workers outside of requests"""
+
+    def test_wait_for_reserves_a_batch_at_once(self, mocker):
+        """Test a batch is reserved in one check, waiting when over the rate"""
+        cache.clear()
+        mocker.patch.dict(SendRateLimiter.THROTTLE_RATES, {"test_send": "2/1s"})
+        limiter = SendRateLimiter("test_send")
+        now = [1000.0]
+        limiter.timer = lambda: now[0]
+        sleep = mocker.patch(
+            "utils.throttles.time.sleep",
+            side_effect=lambda seconds: now.__setitem__(0, now[0] + seconds),
+        )
+
+        acquire = mocker.spy(limiter, "acquire")
+
+        limiter.wait_for(2)
+        limiter.wait_for(2)
+
+        # One reservation per batch, the second waiting a full period
+        assert [call.args[0] for call in sleep.call_args_list] == [
+            pytest.approx(1.0)
+        ]
+        assert [call.args[0] for call in acquire.call_args_list] == [2, 2, 2]
+        with pytest.raises(ValueError):
+            limiter.wait_for(3)
+
+
+class TestBulkSESEmails:
+    template_name = "emails/accounts/general_notification.html"
+
+    def get_client(self, mocker, statuses):
+        client = mocker.Mock()
+        client.send_bulk_templated_email.side_effect = [
+            {"Status": [{"Status": status} for status in batch]}
+            for batch in statuses
+        ]
+        mocker.patch("utils.tasks.emails.AWSClient.get_client", return_value=client)
+        mocker.patch.dict(SendRateLimiter.THROTTLE_RATES, {"ses_send": "100/1s"})
+        return client
+
+    def get_recipients(self, count):
+        return [
+            {"email": f"driver{i}@example.com", "data": {"first_name": f"D{i}"}}
+            for i in range(count)
+        ]
+
+    def test_recipients_sent_in_bulk_calls_at_the_shared_rate(self, mocker):
+        client = self.get_client(
+            mocker, [["Success"] * 50, ["Success"] * 50, ["Success"] * 20]
+        )
+        wait_for = mocker.patch.object(SendRateLimiter, "wait_for")
+
+        send_bulk_email_using_ses.delay(
+            self.template_name,
+            "Compliance notice",
+            self.get_recipients(120),
+            {"title": "New HOS rules", "message": "Read me"},
+        )
+
+        calls = client.send_bulk_templated_email.call_args_list
+        assert [len(call.kwargs["Destinations"]) for call in calls] == [50, 50, 20]
+        assert [call.args[0] for call in wait_for.call_args_list] == [50, 50, 20]
+        assert calls[0].kwargs["Destinations"][1] == {
+            "Destination": {"ToAddresses": ["driver1@example.com"]},
+            "ReplacementTemplateData": '{"first_name": "D1"}',
+        }
+
+        template = client.create_template.call_args.kwargs["Template"]
+        assert "Hi {{first_name}}" in template["HtmlPart"]
+        assert "New HOS rules" in template["HtmlPart"]
+        client.delete_template.assert_called_once_with(
+            TemplateName=template["TemplateName"]
+        )
+
+    def test_only_transient_failures_are_retried(self, mocker):
+        client = self.get_client(
+            mocker,
+            [["Success", "TransientFailure", "MessageRejected"], ["Success"]],
+        )
+
+        send_bulk_email_using_ses.delay(
+            self.template_name, "Notice", self.get_recipients(3)
+        )
+
+        retried = client.send_bulk_templated_email.call_args_list[1]
+        assert retried.kwargs["Destinations"] == [
+            {
+                "Destination": {"ToAddresses": ["driver1@example.com"]},
+                "ReplacementTemplateData": '{"first_name": "D1"}',
+            }
+        ]
+
+    def test_failed_status_is_not_retried(self, mocker):
+        client = self.get_client(mocker, [["Success", "Failed"]])
+
+        send_bulk_email_using_ses.delay(
+            self.template_name, "Notice", self.get_recipients(2)
+        )
+
+        assert client.send_bulk_templated_email.call_count == 1
+
+    def test_template_deleted_when_sending_raises(self, mocker):
+        client = self.get_client(mocker, [])
+        client.send_bulk_templated_email.side_effect = ValueError
+
+        with pytest.raises(ValueError):
+            send_bulk_email_using_ses.apply(
+                (self.template_name, "Notice", self.get_recipients(2)),
+                throw=True,
+            )
+
+        template = client.create_template.call_args.kwargs["Template"]
+        client.delete_template.assert_called_once_with(
+            TemplateName=template["TemplateName"]
+        )
+
+    def test_each_task_uses_its_own_template(self, mocker):
+        client = self.get_client(mocker, [["Success"], ["Success"]])
+
+        for _ in range(2):
+            send_bulk_email_using_ses.delay(
+                self.template_name, "Notice", self.get_recipients(1)
+            )
+
+        created = [
+            call.kwargs["Template"]["TemplateName"]
+            for call in client.create_template.call_args_list
+        ]
+        deleted = [
+            call.kwargs["TemplateName"]
+            for call in client.delete_template.call_args_list
+        ]
+        assert created[0] != created[1]
+        assert deleted == created
+
+
+class TestTaskRoutes:
+    @pytest.mark.parametrize(
+        "task_name, queue",
+        [
+            ("Send Emails", "emails"),
+            ("Send SES Email", "emails"),
+            ("Send SES Bulk Email", "bulk"),
+            ("accounts.tasks.send_welcome_email", "rendering"),
+            ("accounts.tasks.flush_last_logins", "default"),
+        ],
+    )
+    def test_tasks_routed_to_their_queue(self, task_name, queue):
+        route = app.amqp.router.route({}, task_name)
+
+        assert route["queue"].name == queue
+
+    @pytest.mark.parametrize(
+        "queues, warmed",
+        [(["emails"], True), (["rendering", "default"], True), (["bulk"], False)],
+    )
+    def test_templates_warmed_only_for_rendering_queues(
+        self, mocker, queues, warmed
+    ):
+        mocker.patch.object(
+            type(app.amqp.queues),
+            "consume_from",
+            new_callable=mocker.PropertyMock,
+            return_value={name: None for name in queues},
+        )
+        compile_templates = mocker.patch("utils.emails.compile_email_templates")
+
+        warm_email_templates()
+
+        assert compile_templates.called is warmed
@@ -75,30 +75,47 @@ class TestPasswordResetAPI(TestCaseHelper):
 
     def test_request_reset_throttling(self, user_with_password, email_mocker):
         """
-        Ensure that the password reset request is throttled to once every 3 minutes per email.
+        Ensure that password reset requests are throttled to 3 an hour per email.
         """
-        # First request should succeed
-        response = self.client.post(
-            request_reset_url, data={"email": user_with_password.email}
-        )
-        assert response.status_code == status.HTTP_200_OK
+        cache.clear()
+        for _ in range(3):
+            response = self.client.post(
+                request_reset_url, data={"email": user_with_password.email}
+            )
+            assert response.status_code == status.HTTP_200_OK
 
-        # Second request should be throttled
-        # mock_cache.get.return_value = True  # Simulate rate limit hit
+        # Fourth request should be throttled
         response = self.client.post(
             request_reset_url, data={"email": user_with_password.email}
         )
         assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
 
-        # Simulate cache cleared by resetting the mock
+        # Simulate the hour passing by clearing the cache
         cache.clear()
 
         response = self.client.post(
             request_reset_url, data={"email": user_with_password.email}
         )
-        assert email_mocker.call_count == 2
+        assert email_mocker.call_count == 4
         assert response.status_code == status.HTTP_200_OK
 
+    def test_request_reset_throttled_per_ip_across_emails(self, email_mocker):
+        """
+        Ensure that one client cannot avoid the throttle by cycling emails.
+        """
+        cache.clear()
+        for i in range(3):
+            response = self.client.post(
+                request_reset_url, data={"email": f"user{i}@example.com"}
+            )
+            assert response.status_code == status.HTTP_200_OK
+
+        response = self.client.post(
+            request_reset_url, data={"email": "user3@example.com"}
+        )
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        cache.clear()
+
 
 class TestChangePasswordAPI(TestCaseHelper):
     def test_unauthenticated_user_cannot_change_password(self):
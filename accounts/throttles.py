@@ -1,11 +1,21 @@
-from rest_framework.throttling import UserRateThrottle
+from utils.throttles import BaseThrottle, EmailThrottle
 
 
-class PasswordResetThrottle(UserRateThrottle):
-    """Throttle for password reset requests."""
-    rate = "3/hour"
+class PasswordResetThrottle(EmailThrottle):
+    """Throttle for password reset requests, per email."""
+    scope = "password_reset"
 
 
-class ResendEmailTokenThrottle(UserRateThrottle):
-    """Throttle for resending email verification tokens."""
-    rate = "5/hour" 
\ No newline at end of file
+class PasswordResetIPThrottle(BaseThrottle):
+    """Throttle for password reset requests, per user or client IP."""
+    scope = "password_reset_ip"
+
+
+class ResendEmailTokenThrottle(EmailThrottle):
+    """Throttle for resending email verification tokens, per email."""
+    scope = "resend_email_token"
+
+
+class ResendEmailTokenIPThrottle(BaseThrottle):
+    """Throttle for resending email verification tokens, per user or IP."""
+    scope = "resend_email_token_ip"
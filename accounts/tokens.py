@@ -0,0 +1,130 @@
+"""
+Refresh token store for accounts app.
+"""
+
+import logging
+import time
+import uuid
+from datetime import datetime, timezone
+
+import redis
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+logger = logging.getLogger(__name__)
+
+LAST_LOGINS_KEY = "last-logins"
+
+
+class RefreshTokenStore:
+    """
+    Active refresh tokens, kept in the cache (Redis in production) until
+    they expire instead of in the database.
+
+    A refresh token is valid while its jti is in the store and it carries
+    the user's current token generation; `revoke_user` replaces the
+    generation, revoking every token issued before. Generations are
+    random, and a token is invalid when its user's generation is missing,
+    so an evicted generation never brings revoked tokens back. Rotation consumes the
+    old jti with a single delete, so only one of several concurrent
+    refreshes of the same token succeeds.
+
+    Logins are recorded in a Redis hash and written to `User.last_login`
+    in bulk by the `flush_last_logins` task.
+    """
+
+    def add(self, token: RefreshToken) -> None:
+        timeout = max(int(token["exp"] - time.time()), 1)
+        cache.set(self._key(token), True, timeout=timeout)
+
+    def is_active(self, token: RefreshToken) -> bool:
+        user_id = token.get(api_settings.USER_ID_CLAIM)
+        generation = cache.get(self._generation_key(user_id))
+        return (
+            generation is not None
+            and token.get("gen") == generation
+            and cache.get(self._key(token)) is not None
+        )
+
+    def consume(self, token: RefreshToken) -> bool:
+        """Remove the token, returning whether it was still active"""
+        return bool(cache.delete(self._key(token)))
+
+    def revoke(self, token: RefreshToken) -> None:
+        cache.delete(self._key(token))
+
+    def get_generation(self, user_id) -> str:
+        """The user's token generation, starting a new one if it is missing"""
+        key = self._generation_key(user_id)
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        return cache.get(key)
+
+    def revoke_user(self, user_id) -> None:
+        """Revoke every refresh token of the user"""
+        cache.set(self._generation_key(user_id), uuid.uuid4().hex, timeout=None)
+
+    def record_login(self, user_id) -> None:
+        connection = settings.REDIS_CONNECTION_INSTANCE
+        if connection is not None:
+            try:
+                connection.hset(LAST_LOGINS_KEY, str(user_id), time.time())
+                return
+            except redis.RedisError as e:
+                logger.warning(f"Last login of {user_id} not buffered: {e}")
+        self._save_last_logins({str(user_id): time.time()})
+
+    def flush_last_logins(self) -> int:
+        """Write buffered logins to the database, returning their count"""
+        connection = settings.REDIS_CONNECTION_INSTANCE
+        if connection is None:
+            return 0
+
+        pipeline = connection.pipeline()
+        pipeline.hgetall(LAST_LOGINS_KEY)
+        pipeline.delete(LAST_LOGINS_KEY)
+        logins, _ = pipeline.execute()
+        self._save_last_logins(logins)
+        return len(logins)
+
+    def _save_last_logins(self, logins):
+        User = get_user_model()
+        users = [
+            User(
+                pk=user_id,
+                last_login=datetime.fromtimestamp(float(at), tz=timezone.utc),
+            )
+            for user_id, at in logins.items()
+        ]
+        User.objects.bulk_update(users, ["last_login"], batch_size=500)
+
+    def _key(self, token):
+        return f"refresh-token:{token[api_settings.JTI_CLAIM]}"
+
+    def _generation_key(self, user_id):
+        return f"refresh-token-generation:{user_id}"
+
+
+refresh_tokens = RefreshTokenStore()
+
+
+class StoredRefreshToken(RefreshToken):
+    """Refresh token that is only valid while it is in `refresh_tokens`"""
+
+    no_copy_claims = RefreshToken.no_copy_claims + ("gen",)
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token["gen"] = refresh_tokens.get_generation(user.pk)
+        refresh_tokens.add(token)
+        return token
+
+    def verify(self):
+        super().verify()
+        if not refresh_tokens.is_active(self):
+            raise TokenError(_("Token is invalid or expired"))
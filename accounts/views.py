@@ -15,13 +15,24 @@ from .serializers import (
     PasswordTokenValidationSerializer,
     ResendEmailVerificationSerializer,
 )
-from .throttles import PasswordResetThrottle, ResendEmailTokenThrottle
+from .cache import get_profile_window, profile_responses
+from .throttles import (
+    PasswordResetIPThrottle,
+    PasswordResetThrottle,
+    ResendEmailTokenIPThrottle,
+    ResendEmailTokenThrottle,
+)
 from utils.views import (
     XSSPreventionMixinViewSet,
-    BaseAuthenticatedViewSet
+    BaseAuthenticatedViewSet,
+    ConditionalGetMixin,
 )
 from rest_framework.mixins import CreateModelMixin
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from accounts.authentication import CachedJWTAuthentication
+from accounts.tokens import StoredRefreshToken, refresh_tokens
 
 User = get_user_model()
 
@@ -71,12 +82,33 @@ class AuthenticationViewSet(XSSPreventionMixinViewSet):
         serializer.perform_authentication(request)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
-    @action(detail=False, methods=["GET"])
+    @action(
+        detail=False,
+        methods=["GET", "POST"],
+        authentication_classes=[CachedJWTAuthentication],
+    )
     def logout(self, request, **kwargs):
-        # request.user.auth_token.delete() TODO:
+        """
+        Log out, revoking the posted `refresh` token, or every refresh
+        token of the user when none is given
+        """
+        if request.user.is_authenticated:
+            if refresh := request.data.get("refresh"):
+                self._revoke_refresh_token(request.user, refresh)
+            else:
+                refresh_tokens.revoke_user(request.user.pk)
         logout(request)
         return Response(status=status.HTTP_200_OK)
 
+    def _revoke_refresh_token(self, user, refresh):
+        try:
+            token = StoredRefreshToken(refresh)
+        except TokenError:
+            # Already invalid
+            return
+        if str(token.get(api_settings.USER_ID_CLAIM)) == str(user.pk):
+            refresh_tokens.revoke(token)
+
 
 class AccountVerificationViewSet(XSSPreventionMixinViewSet):
 
@@ -99,7 +131,8 @@ class AccountVerificationViewSet(XSSPreventionMixinViewSet):
     )
     def verify_email(self, request, **kwargs):
         """Verify email with token"""
-        serializer = self.get_serializer(request.user, request.data)
+        user = User.objects.get(pk=request.user.pk)
+        serializer = self.get_serializer(user, request.data)
         serializer.is_valid(raise_exception=True)
         serializer.save()
         return Response(serializer.data, status=status.HTTP_200_OK)
@@ -115,11 +148,14 @@ class AccountVerificationViewSet(XSSPreventionMixinViewSet):
         methods=["POST"],
         url_path="resend-email-token",
         serializer_class=ResendEmailVerificationSerializer,
-        throttle_classes=[ResendEmailTokenThrottle],
+        throttle_classes=[
+            ResendEmailTokenThrottle,
+            ResendEmailTokenIPThrottle,
+        ],
     )
     def resend_email_token(self, request, **kwargs):
         """Resend verification email"""
-        serializer = self.serializer_class(request.user)
+        serializer = self.serializer_class(User.objects.get(pk=request.user.pk))
         serializer.resend_email_verification()
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -139,7 +175,7 @@ class PasswordResetViewSet(XSSPreventionMixinViewSet):
         methods=["post"],
         url_path="request-token",
         serializer_class=PasswordResetRequestSerializer,
-        throttle_classes=[PasswordResetThrottle],
+        throttle_classes=[PasswordResetThrottle, PasswordResetIPThrottle],
     )
     def request_password_reset_token(self, request):
         """Handles password reset token generation and email sending."""
@@ -175,7 +211,7 @@ class PasswordResetViewSet(XSSPreventionMixinViewSet):
         return PasswordResetConfirmSerializer(**kwargs)
 
 
-class AccountProfileViewSet(BaseAuthenticatedViewSet):
+class AccountProfileViewSet(BaseAuthenticatedViewSet, ConditionalGetMixin):
     """
     Update a User's profile
     """
@@ -197,19 +233,44 @@ class AccountProfileViewSet(BaseAuthenticatedViewSet):
         serializer_class=AccountProfileSerializer,
     )
     def profile(self, request, **kwargs):
-        serializer = self.serializer_class(request.user, data=request.data)
+        if request.method == "GET":
+            window = get_profile_window()
+            return self.get_conditional_response(
+                request,
+                self.get_etag(
+                    request,
+                    "profile",
+                    request.user.pk,
+                    profile_responses.get_version(request.user.pk),
+                    window,
+                ),
+                None,
+                lambda: profile_responses.get_or_build(
+                    request,
+                    request.user.pk,
+                    "profile",
+                    self._build_profile,
+                    params={"window": window},
+                ),
+            )
+
+        user = User.objects.get(pk=request.user.pk)
+        serializer = self.serializer_class(user, data=request.data)
         serializer.is_valid(raise_exception=True)
         serializer.save()
         return Response(serializer.data, status=status.HTTP_200_OK)
 
-
+    def _build_profile(self):
+        user = User.objects.get(pk=self.request.user.pk)
+        return Response(self.serializer_class(user).data, status=status.HTTP_200_OK)
 
 
 class ChangePasswordViewSet(BaseAuthenticatedViewSet):
     serializer_class = ChangePasswordSerializer
 
     def create(self, request, *args, **kwargs):
-        serializer = self.get_serializer(instance=request.user, data=request.data)
+        user = User.objects.get(pk=request.user.pk)
+        serializer = self.get_serializer(instance=user, data=request.data)
         serializer.is_valid(raise_exception=True)
         serializer.save()
         return Response(status=status.HTTP_204_NO_CONTENT)
@@ -3,7 +3,8 @@ Celery configuration for Django Project Template.
 """
 
 import os
-from celery import Celery
+from celery import Celery, signals
+from kombu import Exchange, Queue
 
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "settings.develop")
@@ -18,6 +19,48 @@ app.config_from_object("django.conf:settings", namespace="CELERY")
 app.autodiscover_tasks()
 
 
+@signals.worker_init.connect
+def declare_dead_letter_queues(**kwargs):
+    """
+    Declare `<DLX prefix>.<queue>` for every queue, bound to the DLX, so
+    rejected tasks are kept for inspection instead of dropped
+    """
+    from django.conf import settings
+
+    if not settings.CELERY_TASK_DEFAULT_QUEUE_DECLARE_DLX:
+        return
+
+    exchange = Exchange(settings.CELERY_BROKER_DLX_EXCHANGE, type="direct")
+    with app.connection_for_write() as connection:
+        for queue in settings.CELERY_TASK_QUEUES:
+            name = f"{settings.CELERY_BROKER_DLX_PREFIX}.{queue.name}"
+            Queue(
+                name,
+                exchange,
+                routing_key=name,
+                durable=settings.CELERY_BROKER_DURABLE,
+                auto_delete=settings.CELERY_BROKER_AUTO_DELETE,
+            ).declare(channel=connection.default_channel)
+
+
+@signals.worker_process_init.connect
+def warm_email_templates(**kwargs):
+    """
+    Inline email CSS when a worker process starts, not on its first send.
+    Only workers consuming a queue whose tasks render emails do so.
+    """
+    from django.conf import settings
+    from utils.emails import compile_email_templates
+
+    rendering_queues = {
+        settings.CELERY_EMAIL_QUEUE,
+        settings.CELERY_RENDERING_QUEUE,
+    }
+    if rendering_queues.isdisjoint(app.amqp.queues.consume_from):
+        return
+    compile_email_templates()
+
+
 @app.task(bind=True)
 def debug_task(self):
     print(f"Request: {self.request!r}") 
\ No newline at end of file
@@ -0,0 +1,57 @@
+import statistics
+import time
+
+from rest_framework import renderers
+from rest_framework.response import Response
+
+from django.core.management.base import BaseCommand
+from core.models import Trip
+from eld.serializers import TripSerializer
+from utils.renderer import ResponseRenderer
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare ResponseRenderer with DRF's stdlib JSON renderer on "
+        "serialized trips"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--trips", type=int, default=50)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        trips = Trip.objects.select_related("route").prefetch_related(
+            "log_entries__activity_periods"
+        )[: options["trips"]]
+        data = TripSerializer(trips, many=True).data
+        if not data:
+            self.stdout.write("No trips to render")
+            return
+
+        context = {"response": Response()}
+        envelope = {"error": None, "message": "Success", "data": data}
+        stdlib = self._time(
+            lambda: renderers.JSONRenderer().render(envelope, None, context),
+            options["repeat"],
+        )
+        fast = self._time(
+            lambda: ResponseRenderer().render(data, None, context),
+            options["repeat"],
+        )
+        size = len(ResponseRenderer().render(data, None, context))
+
+        self.stdout.write(
+            f"{len(data)} trips, {size / 1024:.1f} KB: "
+            f"stdlib {stdlib:.2f}ms, ResponseRenderer {fast:.2f}ms "
+            f"({stdlib / fast:.1f}x faster)"
+        )
+
+    def _time(self, render, repeat):
+        """Median render time in milliseconds"""
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            render()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
@@ -0,0 +1,63 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from utils.views import has_XSS
+
+
+def substring_has_xss(data):
+    """The per-fragment substring scan has_XSS replaced, for comparison"""
+    data = str(data).lower()
+    for fragment in (
+        "<script",
+        " javascript:",
+        " onerror=",
+        " onload=",
+        " onclick=",
+        " onmouseover=",
+        " onfocus=",
+        " onsubmit=",
+    ):
+        if fragment in data:
+            return True
+    return False
+
+
+class Command(BaseCommand):
+    help = "Compare has_XSS with the substring scan on a clean duty-event batch"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--events", type=int, default=5000)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        # A clean batch is the worst case: every value has to be scanned
+        batch = {
+            "events": [
+                {
+                    "activity": "driving",
+                    "start_time": "06:00",
+                    "end_time": "10:30",
+                    "location": f"Mile marker {index}, I-80 Westbound",
+                    "remarks": "Driving to destination",
+                    "odometer": 120000 + index,
+                }
+                for index in range(options["events"])
+            ]
+        }
+
+        substring = self._time(lambda: substring_has_xss(batch), options["repeat"])
+        single_pass = self._time(lambda: has_XSS(batch), options["repeat"])
+        self.stdout.write(
+            f"{options['events']} events: substring {substring:.2f}ms, "
+            f"has_XSS {single_pass:.2f}ms ({substring / single_pass:.1f}x)"
+        )
+
+    def _time(self, scan, repeat):
+        """Median scan time in milliseconds"""
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            scan()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
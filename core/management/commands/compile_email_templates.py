@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+from utils.emails import compile_email_templates
+
+
+class Command(BaseCommand):
+    help = "Inline the CSS of every email template and check they compile"
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        names = compile_email_templates()
+        elapsed = time.perf_counter() - started
+        for name in names:
+            self.stdout.write(f"  {name}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Compiled {len(names)} email templates in {elapsed:.2f}s"
+            )
+        )
@@ -0,0 +1,55 @@
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from core.models import LogEntry, Route
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the bytes and load time saved per list page by deferring "
+        "heavy JSON columns on ELD models"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--page-size", type=int, default=50)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        page_size, repeat = options["page_size"], options["repeat"]
+
+        for model in (Route, LogEntry):
+            page = model.objects.all()[:page_size]
+            rows = list(page)
+            if not rows:
+                self.stdout.write(f"{model.__name__}: no rows to measure")
+                continue
+
+            # Size of the JSON text the database no longer sends
+            saved_bytes = sum(
+                len(json.dumps(getattr(row, field)))
+                for row in rows
+                for field in model.HEAVY_FIELDS
+            )
+            full = self._time(lambda page=page: list(page.all()), repeat)
+            deferred = self._time(
+                lambda page=page: list(page.all().without_heavy_fields()),
+                repeat,
+            )
+
+            self.stdout.write(
+                f"{model.__name__}: {len(rows)} rows, "
+                f"{saved_bytes / 1024:.1f} KB skipped, "
+                f"load {full:.2f}ms -> {deferred:.2f}ms "
+                f"({full - deferred:.2f}ms saved per page)"
+            )
+
+    def _time(self, load, repeat):
+        """Median load time in milliseconds"""
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            load()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
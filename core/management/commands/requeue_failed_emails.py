@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from utils.tasks.emails import requeue_failed_emails
+
+
+class Command(BaseCommand):
+    help = "Queue the emails kept in the failed store to be sent again"
+
+    def handle(self, *args, **options):
+        count = requeue_failed_emails()
+        self.stdout.write(self.style.SUCCESS(f"Requeued {count} emails"))
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-19 07:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_logentry_activityperiod_trip_route_logentry_trip_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='route',
+            name='stops',
+            field=models.JSONField(default=list, help_text='Ordered list of pickups and drops'),
+        ),
+    ]
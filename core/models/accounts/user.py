@@ -16,6 +16,7 @@ from accounts.emails import (
     SharePasswordEmail,
     PasswordResetEmail,
 )
+from accounts.tokens import refresh_tokens
 from core.choices import Gender
 from django.contrib.auth.models import UserManager as DjangoUserManager
 from django.utils import timezone
@@ -184,6 +185,7 @@ class User(TimeStampUUIDModel, AbstractUser):
         """Internal method to change the user's password."""
         self.set_password(new_password)
         self.save()
+        refresh_tokens.revoke_user(self.pk)
 
     # Emails
     def _send_verification_email(self):
@@ -7,6 +7,17 @@ from django.db import models
 from django.utils.translation import gettext_lazy as _
 
 
+class HeavyFieldsQuerySet(models.QuerySet):
+    """
+    QuerySet for models with large columns listed in `HEAVY_FIELDS` on the
+    model, which list pages can skip loading.
+    """
+
+    def without_heavy_fields(self):
+        """Defer loading (and decoding) of the model's heavy columns"""
+        return self.defer(*self.model.HEAVY_FIELDS)
+
+
 class TimeStampModel(models.Model):
     """
     Base model class with common fields.
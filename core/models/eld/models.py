@@ -1,9 +1,11 @@
 from django.db import models
+from django.utils.functional import cached_property
 from django.core.validators import MinValueValidator, MaxValueValidator
 from datetime import datetime, timedelta
 from core.models.accounts import User
 
-from core.models.base import TimeStampUUIDModel
+from core.models.base import HeavyFieldsQuerySet, TimeStampUUIDModel
+from utils.geometry import decode_polyline
 
 
 class Trip(TimeStampUUIDModel):
@@ -97,9 +99,23 @@ class Route(TimeStampUUIDModel):
         default=list, help_text="List of fuel stops along the route"
     )
 
+    # Pickups and drops
+    stops = models.JSONField(
+        default=list, help_text="Ordered list of pickups and drops"
+    )
+
+    HEAVY_FIELDS = ("route_data", "rest_stops", "fuel_stops")
+
+    objects = HeavyFieldsQuerySet.as_manager()
+
     def __str__(self):
         return f"Route for Trip {self.trip.uid}"
 
+    @cached_property
+    def coordinates(self):
+        """Route geometry decoded into (latitude, longitude) pairs"""
+        return decode_polyline(self.route_data.get("geometry") or "")
+
 
 class LogEntry(TimeStampUUIDModel):
     """Model for individual log entries (24-hour periods)"""
@@ -134,6 +150,10 @@ class LogEntry(TimeStampUUIDModel):
         default=dict, help_text="Hourly breakdown of activities"
     )
 
+    HEAVY_FIELDS = ("log_data",)
+
+    objects = HeavyFieldsQuerySet.as_manager()
+
     class Meta:
         unique_together = ["trip", "date"]
         ordering = ["date"]
@@ -173,9 +193,12 @@ class ActivityPeriod(TimeStampUUIDModel):
 
     @property
     def duration_hours(self):
-        """Calculate duration in hours"""
+        """
+        Calculate duration in hours. Periods are never empty, so one that
+        ends at the time it starts runs midnight to midnight, a whole day.
+        """
         start = datetime.combine(datetime.today(), self.start_time)
         end = datetime.combine(datetime.today(), self.end_time)
-        if end < start:
+        if end <= start:
             end += timedelta(days=1)
         return (end - start).total_seconds() / 3600
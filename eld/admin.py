@@ -2,6 +2,19 @@ from django.contrib import admin
 from core.models import Trip, Route, LogEntry, ActivityPeriod
 
 
+class DeferHeavyFieldsAdmin(admin.ModelAdmin):
+    """Skip loading large JSON columns on the changelist"""
+
+    deferred_fields = ()
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        match = request.resolver_match
+        if match and match.url_name.endswith("_changelist"):
+            queryset = queryset.defer(*self.deferred_fields)
+        return queryset
+
+
 @admin.register(Trip)
 class TripAdmin(admin.ModelAdmin):
     list_display = [
@@ -51,20 +64,22 @@ class TripAdmin(admin.ModelAdmin):
 
 
 @admin.register(Route)
-class RouteAdmin(admin.ModelAdmin):
+class RouteAdmin(DeferHeavyFieldsAdmin):
     list_display = ["uid", "trip", "total_distance", "total_duration", "created_at"]
+    list_select_related = ["trip"]
+    deferred_fields = Route.HEAVY_FIELDS
     list_filter = ["created_at"]
     readonly_fields = ["uid", "created_at", "updated_at"]
 
     fieldsets = (
         ("Route Information", {"fields": ("uid", "trip", "total_distance", "total_duration")}),
-        ("Route Data", {"fields": ("route_data", "rest_stops", "fuel_stops")}),
+        ("Route Data", {"fields": ("route_data", "stops", "rest_stops", "fuel_stops")}),
         ("Timestamps", {"fields": ("created_at", "updated_at")}),
     )
 
 
 @admin.register(LogEntry)
-class LogEntryAdmin(admin.ModelAdmin):
+class LogEntryAdmin(DeferHeavyFieldsAdmin):
     list_display = [
         "uid",
         "trip",
@@ -77,6 +92,8 @@ class LogEntryAdmin(admin.ModelAdmin):
     list_filter = ["date", "created_at"]
     search_fields = ["driver_name", "carrier_name", "trip__pickup_location"]
     readonly_fields = ["uid", "created_at", "updated_at"]
+    list_select_related = ["trip"]
+    deferred_fields = LogEntry.HEAVY_FIELDS
 
     fieldsets = (
         ("Log Information", {"fields": ("uid", "trip", "date", "start_time", "end_time")}),
@@ -91,7 +108,7 @@ class LogEntryAdmin(admin.ModelAdmin):
 
 
 @admin.register(ActivityPeriod)
-class ActivityPeriodAdmin(admin.ModelAdmin):
+class ActivityPeriodAdmin(DeferHeavyFieldsAdmin):
     list_display = [
         "uid",
         "log_entry",
@@ -104,6 +121,10 @@ class ActivityPeriodAdmin(admin.ModelAdmin):
     list_filter = ["activity", "start_time"]
     search_fields = ["location", "remarks", "log_entry__driver_name"]
     readonly_fields = ["uid", "duration_hours"]
+    list_select_related = ["log_entry__trip"]
+    deferred_fields = [
+        f"log_entry__{field}" for field in LogEntry.HEAVY_FIELDS
+    ]
 
     fieldsets = (
         (
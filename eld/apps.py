@@ -4,4 +4,8 @@ from django.apps import AppConfig
 class EldConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'eld'
-    verbose_name = 'Electronic Logging Device' 
\ No newline at end of file
+    verbose_name = 'Electronic Logging Device'
+
+    def ready(self):
+        """Import signals when app is ready."""
+        import eld.signals  # noqa
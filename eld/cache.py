@@ -0,0 +1,9 @@
+"""
+Response caches of the ELD endpoints.
+"""
+
+from utils.cache import ResponseCache
+
+# Rendered trip logs and routes, keyed by driver and invalidated by
+# eld.signals whenever one of the driver's trips changes
+driver_responses = ResponseCache("eld", timeout=60 * 60 * 24)
@@ -0,0 +1,394 @@
+"""
+Optimizers used by the ELD trip planning services.
+"""
+
+import datetime
+import math
+import time
+from typing import Any, Dict, List, Sequence, Set, Tuple
+
+
+class StopSequenceOptimizer:
+    """
+    Reorder flexible stops to reduce total route distance.
+
+    Stops flagged as fixed (including the first and last stop) keep their
+    position and split the route into segments; flexible stops are only
+    reordered inside their own segment. Each segment is seeded with a
+    nearest-neighbour tour and refined with 2-opt until no improving move
+    is left or the time limit is reached. Both steps keep every
+    precedence constraint, e.g. a pickup before its dropoff.
+    """
+
+    def __init__(self, time_limit: float = 0.05):
+        self.time_limit = time_limit  # seconds
+
+    def optimize(
+        self,
+        matrix: Sequence[Sequence[float]],
+        fixed: Sequence[bool],
+        precedence: Sequence[Tuple[int, int]] = (),
+    ) -> List[int]:
+        """
+        Return the optimized visiting order as a list of stop indexes.
+
+        Args:
+            matrix: Square distance matrix, matrix[i][j] is the distance
+                from stop i to stop j.
+            fixed: One flag per stop, True when the stop must keep its
+                position in the sequence.
+            precedence: (before, after) pairs of stops, where `before`
+                must be visited first. The input order must satisfy them.
+        """
+        size = len(matrix)
+        if size != len(fixed):
+            raise ValueError("Distance matrix and stops must have the same size")
+        if size < 4:
+            return list(range(size))
+
+        predecessors = {index: set() for index in range(size)}
+        for before, after in precedence:
+            predecessors[after].add(before)
+
+        deadline = time.monotonic() + self.time_limit
+        anchors = [
+            index
+            for index in range(size)
+            if fixed[index] or index in (0, size - 1)
+        ]
+
+        order = [anchors[0]]
+        for start, end in zip(anchors, anchors[1:]):
+            flexible = list(range(start + 1, end))
+            segment = self._nearest_neighbour(
+                matrix, start, flexible, predecessors
+            )
+            path = self._two_opt(
+                matrix, [start, *segment, end], predecessors, deadline
+            )
+            order.extend(path[1:])
+        return order
+
+    def route_distance(
+        self, matrix: Sequence[Sequence[float]], order: Sequence[int]
+    ) -> float:
+        """Total distance of visiting the stops in the given order"""
+        return sum(matrix[a][b] for a, b in zip(order, order[1:]))
+
+    def _nearest_neighbour(
+        self,
+        matrix: Sequence[Sequence[float]],
+        start: int,
+        stops: List[int],
+        predecessors: Dict[int, Set[int]],
+    ) -> List[int]:
+        """
+        Greedy tour from `start` through all `stops`, only moving to stops
+        whose predecessors in the segment were all visited
+        """
+        remaining = list(stops)
+        path = []
+        current = start
+        while remaining:
+            waiting = set(remaining)
+            ready = [stop for stop in remaining if not predecessors[stop] & waiting]
+            current = min(ready, key=lambda stop: matrix[current][stop])
+            remaining.remove(current)
+            path.append(current)
+        return path
+
+    def _two_opt(
+        self,
+        matrix: Sequence[Sequence[float]],
+        path: List[int],
+        predecessors: Dict[int, Set[int]],
+        deadline: float,
+    ) -> List[int]:
+        """
+        Improve a path with fixed endpoints using 2-opt moves, skipping
+        moves that would visit a stop before one of its predecessors
+        """
+        best_distance = self.route_distance(matrix, path)
+        improved = True
+        while improved and time.monotonic() < deadline:
+            improved = False
+            for i in range(1, len(path) - 2):
+                for k in range(i + 1, len(path) - 1):
+                    reversed_stops = set(path[i : k + 1])
+                    if any(
+                        predecessors[stop] & reversed_stops
+                        for stop in reversed_stops
+                    ):
+                        continue
+                    candidate = path[:i] + path[i : k + 1][::-1] + path[k + 1 :]
+                    distance = self.route_distance(matrix, candidate)
+                    if distance < best_distance:
+                        path, best_distance = candidate, distance
+                        improved = True
+                if time.monotonic() >= deadline:
+                    break
+        return path
+
+
+class BreakScheduler:
+    """
+    Place breaks and resets along a trip so it finishes as early as
+    possible while staying within the Hours of Service limits.
+
+    The trip is walked stop by stop and in `step_minutes` driving steps.
+    Before every step a label (clock plus HOS counters) may continue as is,
+    take a 30-minute break, take a 10-hour reset or, when the cycle is
+    exhausted, a 34-hour restart. Labels that are no better than another
+    label on every counter are dropped and at most `max_labels` are kept
+    per step, which bounds the work to a few thousand transitions.
+    """
+
+    def __init__(
+        self,
+        max_driving_hours: float = 11,
+        max_on_duty_hours: float = 14,
+        min_off_duty_hours: float = 10,
+        max_cycle_hours: float = 70,
+        break_required_after: float = 8,
+        break_minutes: int = 30,
+        restart_hours: float = 34,
+        service_minutes: int = 60,
+        step_minutes: int = 15,
+        max_labels: int = 24,
+    ):
+        self.max_driving = max_driving_hours * 60
+        self.max_on_duty = max_on_duty_hours * 60
+        self.min_off_duty = min_off_duty_hours * 60
+        self.max_cycle = max_cycle_hours * 60
+        self.break_required_after = break_required_after * 60
+        self.break_minutes = break_minutes
+        self.restart = restart_hours * 60
+        self.service_minutes = service_minutes
+        self.step_minutes = step_minutes
+        self.max_labels = max_labels
+
+    def schedule(
+        self,
+        stops: List[Dict[str, Any]],
+        leg_hours: List[float],
+        start: int = 0,
+        cycle_used: float = 0,
+    ) -> List[Dict[str, Any]]:
+        """
+        Return the fastest compliant list of duty events for a trip.
+
+        Args:
+            stops: Ordered stops, each with a `location`, a `type` and
+                optional `opens_at`/`closes_at` ("HH:MM") opening hours.
+            leg_hours: Driving hours between consecutive stops.
+            start: Minute the trip starts at, counted from midnight of the
+                first day.
+            cycle_used: Hours already used in the driver's current cycle.
+
+        Events carry `activity`, `start` and `end` (minutes from midnight
+        of the first day), `location` and `remarks`.
+        """
+        if len(leg_hours) != len(stops) - 1:
+            raise ValueError("Trip needs exactly one leg between each stop")
+
+        # Label: (time, driving since break, shift driving, shift start,
+        # cycle used, events)
+        labels = [(start, 0, 0, start, cycle_used * 60, None)]
+        for index, stop in enumerate(stops):
+            labels = self._advance(labels, stop["location"], self._serve(stop))
+            if index == len(leg_hours):
+                break
+
+            destination = stops[index + 1]["location"]
+            steps = math.ceil(leg_hours[index] * 60 / self.step_minutes)
+            drive = self._drive(
+                self.step_minutes, f"{stop['location']} to {destination}"
+            )
+            for _ in range(steps):
+                labels = self._advance(
+                    labels, f"En route to {destination}", drive
+                )
+            if not labels:
+                raise ValueError("Unable to schedule trip within HOS limits")
+
+        best = min(labels, key=lambda label: label[0])
+        events = []
+        node = best[5]
+        while node:
+            event, node = node
+            events.append(event)
+        return [
+            dict(zip(("activity", "start", "end", "location", "remarks"), e))
+            for e in reversed(events)
+        ]
+
+    def _advance(self, labels, location, step):
+        """Apply optional rests and then `step` to every label"""
+        candidates = []
+        for label in labels:
+            for rested in self._rest_options(label, location):
+                advanced = step(rested)
+                if advanced is not None:
+                    candidates.append(advanced)
+        return self._prune(candidates)
+
+    def _rest_options(self, label, location):
+        """Yield the label unchanged and after each kind of rest"""
+        t, since_break, shift_driving, shift_start, cycle, events = label
+        yield label
+        if since_break:
+            yield (
+                t + self.break_minutes,
+                0,
+                shift_driving,
+                shift_start,
+                cycle,
+                self._push(
+                    events,
+                    ("off_duty", t, t + self.break_minutes, location,
+                     "30-minute break"),
+                ),
+            )
+        if t > shift_start:
+            end = t + self.min_off_duty
+            yield (
+                end,
+                0,
+                0,
+                end,
+                cycle,
+                self._push(
+                    events,
+                    ("sleeper_berth", t, end, location, "10-hour reset"),
+                ),
+            )
+        if cycle + self.step_minutes > self.max_cycle:
+            end = t + self.restart
+            yield (
+                end,
+                0,
+                0,
+                end,
+                0,
+                self._push(events, ("off_duty", t, end, location, "34-hour restart")),
+            )
+
+    def _drive(self, minutes, location):
+        """Build a step that drives for `minutes` if the label allows it"""
+
+        def step(label):
+            t, since_break, shift_driving, shift_start, cycle, events = label
+            if (
+                since_break + minutes > self.break_required_after
+                or shift_driving + minutes > self.max_driving
+                or t + minutes - shift_start > self.max_on_duty
+                or cycle + minutes > self.max_cycle
+            ):
+                return None
+            return (
+                t + minutes,
+                since_break + minutes,
+                shift_driving + minutes,
+                shift_start,
+                cycle + minutes,
+                self._push(
+                    events,
+                    ("driving", t, t + minutes, location, "Driving to destination"),
+                ),
+            )
+
+        return step
+
+    def _serve(self, stop):
+        """Build a step that waits for opening hours and serves `stop`"""
+        remarks = {
+            "pickup": "Pickup and pre-trip inspection",
+            "dropoff": "Dropoff and post-trip inspection",
+        }.get(stop.get("type"), "On duty at stop")
+
+        def step(label):
+            if stop.get("type") == "start":
+                # Trip starts here, nothing to load or unload
+                return label
+
+            t, since_break, shift_driving, shift_start, cycle, events = label
+            wait = self._wait_for_opening(t, stop)
+            if wait:
+                events = self._push(
+                    events,
+                    ("off_duty", t, t + wait, stop["location"],
+                     "Waiting for stop to open"),
+                )
+                if wait >= self.break_minutes:
+                    since_break = 0
+                if wait >= self.min_off_duty:
+                    shift_driving, shift_start = 0, t + wait
+                t += wait
+
+            end = t + self.service_minutes
+            if self.service_minutes >= self.break_minutes:
+                since_break = 0
+            return (
+                end,
+                since_break,
+                shift_driving,
+                shift_start,
+                cycle + self.service_minutes,
+                self._push(
+                    events,
+                    ("on_duty_not_driving", t, end, stop["location"], remarks),
+                ),
+            )
+
+        return step
+
+    def _wait_for_opening(self, t, stop):
+        """
+        Minutes to wait until the stop can be served within its hours. A
+        window closing before it opens runs overnight, e.g. 22:00-06:00.
+        """
+        if not stop.get("opens_at") or not stop.get("closes_at"):
+            return 0
+        opens = self._minutes(stop["opens_at"])
+        length = (self._minutes(stop["closes_at"]) - opens) % 1440
+        if length < self.service_minutes:
+            return 0
+
+        clock = t % 1440
+        if (clock - opens) % 1440 + self.service_minutes <= length:
+            return 0
+        return (opens - clock) % 1440
+
+    def _prune(self, labels):
+        """Drop dominated labels and keep the `max_labels` earliest ones"""
+        labels.sort(key=lambda label: label[:5])
+        kept = []
+        for label in labels:
+            t, since_break, shift_driving, shift_start, cycle, _ = label
+            if not any(
+                k[0] <= t
+                and k[1] <= since_break
+                and k[2] <= shift_driving
+                and k[3] >= shift_start
+                and k[4] <= cycle
+                for k in kept
+            ):
+                kept.append(label)
+                if len(kept) == self.max_labels:
+                    break
+        return kept
+
+    @staticmethod
+    def _minutes(value: str) -> int:
+        """Minutes since midnight for an "HH:MM" string"""
+        clock = datetime.time.fromisoformat(value)
+        return clock.hour * 60 + clock.minute
+
+    @staticmethod
+    def _push(events, event):
+        """Append an event, merging contiguous periods of one activity"""
+        if events:
+            (activity, start, end, location, remarks), previous = events
+            if activity == event[0] == "driving" and end == event[1]:
+                return ((activity, start, event[2], location, remarks), previous)
+        return (event, events)
@@ -33,13 +33,40 @@ class LogEntrySerializer(serializers.ModelSerializer):
         ]
 
 
+class LogEntryListSerializer(LogEntrySerializer):
+    """
+    Serializer for listing LogEntry models without the hourly grid
+    (`log_data`), which only the detail response includes
+    """
+
+    class Meta(LogEntrySerializer.Meta):
+        fields = [
+            field for field in LogEntrySerializer.Meta.fields
+            if field not in LogEntry.HEAVY_FIELDS
+        ]
+
+
 class RouteSerializer(serializers.ModelSerializer):
     """Serializer for Route model"""
     class Meta:
         model = Route
         fields = [
             'uid', 'route_data', 'total_distance', 'total_duration',
-            'rest_stops', 'fuel_stops', 'created_at', 'updated_at'
+            'rest_stops', 'fuel_stops', 'stops', 'created_at', 'updated_at'
+        ]
+
+
+class RouteListSerializer(RouteSerializer):
+    """
+    Serializer for listing Route models without `route_data`, `rest_stops`
+    and `fuel_stops`, which only the detail response includes. The
+    planned `stops` are kept.
+    """
+
+    class Meta(RouteSerializer.Meta):
+        fields = [
+            field for field in RouteSerializer.Meta.fields
+            if field not in Route.HEAVY_FIELDS
         ]
 
 
@@ -71,6 +98,15 @@ class TripSerializer(serializers.ModelSerializer):
         ]
 
 
+class TripListSerializer(TripSerializer):
+    """
+    Serializer for listing Trip models with their route and log entries
+    in list form, without the heavy fields above
+    """
+    route = RouteListSerializer(read_only=True)
+    log_entries = LogEntryListSerializer(many=True, read_only=True)
+
+
 class TripCreateSerializer(serializers.ModelSerializer):
     """Serializer for creating new trips"""
     class Meta:
@@ -85,6 +121,20 @@ class TripCreateSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
+class TripStopSerializer(serializers.Serializer):
+    """Serializer for an intermediate pickup or drop on a trip"""
+    STOP_TYPE_CHOICES = [
+        ("pickup", "Pickup"),
+        ("dropoff", "Dropoff"),
+    ]
+
+    location = serializers.CharField(max_length=255)
+    type = serializers.ChoiceField(choices=STOP_TYPE_CHOICES)
+    flexible = serializers.BooleanField(default=True)
+    opens_at = serializers.TimeField(required=False)
+    closes_at = serializers.TimeField(required=False)
+
+
 class TripPlanRequestSerializer(serializers.Serializer):
     """Serializer for trip planning requests"""
     current_location = serializers.CharField(max_length=255)
@@ -97,6 +147,7 @@ class TripPlanRequestSerializer(serializers.Serializer):
     driver_name = serializers.CharField(max_length=255, required=False)
     carrier_name = serializers.CharField(max_length=255, required=False)
     vehicle_numbers = serializers.CharField(max_length=255, required=False)
+    stops = TripStopSerializer(many=True, required=False)
 
 
 class LogGenerationRequestSerializer(serializers.Serializer):
@@ -104,4 +155,10 @@ class LogGenerationRequestSerializer(serializers.Serializer):
     start_date = serializers.DateField()
     driver_name = serializers.CharField(max_length=255, required=False)
     carrier_name = serializers.CharField(max_length=255, required=False)
-    vehicle_numbers = serializers.CharField(max_length=255, required=False) 
\ No newline at end of file
+    vehicle_numbers = serializers.CharField(max_length=255, required=False) 
+
+
+class MapDataQuerySerializer(serializers.Serializer):
+    """Serializer for route map data query parameters"""
+    zoom = serializers.IntegerField(min_value=0, max_value=22, required=False)
+    tolerance = serializers.FloatField(min_value=0, required=False)
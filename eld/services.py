@@ -1,8 +1,23 @@
-import requests
+import copy
+import hashlib
+import math
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, time
 from decimal import Decimal
 from typing import List, Dict, Any, Tuple
+from django.conf import settings
+from django.core.cache import cache
 from core.models import Trip, Route, LogEntry, ActivityPeriod
+from utils.api.http.client import HTTPClient
+from utils.geometry import encode_polyline, join_polylines
+from utils.singleflight import SingleFlight
+from .cache import driver_responses
+from .optimizers import BreakScheduler, StopSequenceOptimizer
+
+METERS_PER_MILE = 1609.344
+GEOCODE_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+
+route_requests = SingleFlight("route")
 
 
 class MapService:
@@ -10,8 +25,12 @@ class MapService:
 
     def __init__(self):
         # Using OpenRouteService API (free tier available)
-        self.base_url = "https://api.openrouteservice.org/v2/directions"
-        self.api_key = None  # Will be set from environment
+        self.base_url = "https://api.openrouteservice.org"
+        self.api_key = settings.OPENROUTESERVICE_API_KEY
+        self.client = HTTPClient.for_provider(
+            "openrouteservice", base_url=self.base_url
+        )
+        self.geocodes: Dict[str, str] = {}
 
     def get_route(
         self, origin: str, destination: str, waypoints: List[str] = None
@@ -20,20 +39,50 @@ class MapService:
         Get route information from map API
         Returns route data with distance, duration, and waypoints
         """
+        waypoints = waypoints or []
+        key = hashlib.sha1(
+            "|".join([origin, *waypoints, destination]).lower().encode()
+        ).hexdigest()
+
+        # Identical concurrent lookups share a single provider call
+        route_data = route_requests.do(
+            key, lambda: self._get_route(origin, destination, waypoints)
+        )
+        return copy.deepcopy(route_data)
+
+    def _get_route(
+        self, origin: str, destination: str, waypoints: List[str]
+    ) -> Dict[str, Any]:
+        """Calculate a route through the map API"""
         try:
-            # For now, return mock data - in production, integrate with actual API
-            # This would be replaced with actual API call to OpenRouteService or similar
+            locations = [origin, *waypoints, destination]
+
+            # Route every leg between consecutive stops
+            legs = [
+                self._get_leg(start, end)
+                for start, end in zip(locations, locations[1:])
+            ]
+            distance = sum(leg["distance"] for leg in legs)
+            duration = sum(leg["duration"] for leg in legs)
+            geometry = join_polylines(
+                [leg.pop("geometry") for leg in legs if "geometry" in leg]
+            )
 
-            # Mock route calculation (simplified)
             route_data = {
-                "distance": 500.0,  # miles
-                "duration": 8.5,  # hours
+                "distance": distance,  # miles
+                "duration": duration,  # hours
                 "waypoints": [
                     {"location": origin, "type": "origin"},
+                    *[
+                        {"location": waypoint, "type": "waypoint"}
+                        for waypoint in waypoints
+                    ],
                     {"location": destination, "type": "destination"},
                 ],
-                "rest_stops": self._calculate_rest_stops(500.0),
-                "fuel_stops": self._calculate_fuel_stops(500.0),
+                "legs": legs,
+                "geometry": geometry,  # Encoded polyline
+                "rest_stops": self._calculate_rest_stops(distance),
+                "fuel_stops": self._calculate_fuel_stops(distance),
             }
 
             return route_data
@@ -41,6 +90,127 @@ class MapService:
         except Exception as e:
             raise Exception(f"Failed to get route: {str(e)}")
 
+    def combine_routes(self, routes: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Join consecutive routes, where each route starts at the previous
+        route's destination, into a single route
+        """
+        distance = sum(route["distance"] for route in routes)
+        waypoints = [routes[0]["waypoints"][0]]
+        for route in routes:
+            waypoints.extend(route["waypoints"][1:])
+        # Junctions between routes become waypoints
+        waypoints[1:-1] = [
+            {**waypoint, "type": "waypoint"} for waypoint in waypoints[1:-1]
+        ]
+
+        return {
+            "distance": distance,
+            "duration": sum(route["duration"] for route in routes),
+            "waypoints": waypoints,
+            "legs": [leg for route in routes for leg in route["legs"]],
+            "geometry": join_polylines(
+                [route.get("geometry", "") for route in routes]
+            ),
+            "rest_stops": self._calculate_rest_stops(distance),
+            "fuel_stops": self._calculate_fuel_stops(distance),
+        }
+
+    def get_distance_matrix(self, locations: List[str]) -> List[List[float]]:
+        """
+        Get the driving distance (miles) between every pair of locations,
+        from a single call to the provider's matrix endpoint. Pairs the
+        provider cannot route between are infinitely far apart.
+        """
+        if not self.api_key:
+            # Mock distances (simplified) when no provider is configured
+            return [
+                [0.0 if i == j else 500.0 for j in range(len(locations))]
+                for i in range(len(locations))
+            ]
+
+        coordinates = [
+            [float(value) for value in self._geocode(location).split(",")]
+            for location in locations
+        ]
+        # The matrix is only read, so the POST is safe to retry
+        response = self.client.post(
+            "v2/matrix/driving-hgv",
+            retry=True,
+            headers={"Authorization": self.api_key},
+            json={
+                "locations": coordinates,
+                "metrics": ["distance"],
+                "units": "mi",
+            },
+        )
+        return [
+            [math.inf if distance is None else distance for distance in row]
+            for row in response.json()["distances"]
+        ]
+
+    def _get_leg(self, origin: str, destination: str) -> Dict[str, Any]:
+        """Get distance and duration for a single leg"""
+        if not self.api_key:
+            # Mock leg calculation (simplified) when no provider is configured
+            return {
+                "origin": origin,
+                "destination": destination,
+                "distance": 500.0,  # miles
+                "duration": 8.5,  # hours
+            }
+
+        response = self.client.get(
+            "v2/directions/driving-hgv",
+            params={
+                "api_key": self.api_key,
+                "start": self._geocode(origin),
+                "end": self._geocode(destination),
+            },
+        )
+        feature = response.json()["features"][0]
+        summary = feature["properties"]["summary"]
+        return {
+            "origin": origin,
+            "destination": destination,
+            "distance": round(summary["distance"] / METERS_PER_MILE, 2),
+            "duration": round(summary["duration"] / 3600, 2),
+            # GeoJSON coordinates are (longitude, latitude)
+            "geometry": encode_polyline(
+                [
+                    (latitude, longitude)
+                    for longitude, latitude in feature["geometry"]["coordinates"]
+                ]
+            ),
+        }
+
+    def _geocode(self, location: str) -> str:
+        """
+        Resolve a location to "longitude,latitude". Results are kept for
+        the service's lifetime and in the shared cache, so each distinct
+        address is looked up once however many legs it is part of.
+        """
+        address = location.strip().lower().encode()
+        key = f"geocode:{hashlib.sha1(address).hexdigest()}"
+        if key in self.geocodes:
+            return self.geocodes[key]
+
+        coordinates = cache.get(key)
+        if coordinates is None:
+            response = self.client.get(
+                "geocode/search",
+                params={"api_key": self.api_key, "text": location, "size": 1},
+            )
+            features = response.json()["features"]
+            if not features:
+                raise ValueError(f"Unknown location: {location}")
+            longitude, latitude = features[0]["geometry"]["coordinates"]
+            coordinates = f"{longitude},{latitude}"
+            cache.set(key, coordinates, timeout=GEOCODE_CACHE_TIMEOUT)
+
+        self.geocodes[key] = coordinates
+        return coordinates
+
     def _calculate_rest_stops(self, distance: float) -> List[Dict[str, Any]]:
         """Calculate rest stops based on HOS requirements"""
         stops = []
@@ -104,6 +274,14 @@ class HOSService:
         self.min_off_duty_hours = 10
         self.max_cycle_hours = 70
         self.break_required_after = 8  # hours
+        self.day_start = time(6, 0)  # Trips start at 6 AM
+        self.scheduler = BreakScheduler(
+            max_driving_hours=self.max_driving_hours,
+            max_on_duty_hours=self.max_on_duty_hours,
+            min_off_duty_hours=self.min_off_duty_hours,
+            max_cycle_hours=self.max_cycle_hours,
+            break_required_after=self.break_required_after,
+        )
 
     def calculate_trip_logs(
         self, trip: Trip, start_date: datetime.date
@@ -117,48 +295,96 @@ class HOSService:
         if not trip.estimated_duration:
             raise ValueError("Trip must have estimated duration")
 
+        # Place breaks and resets for the whole trip
+        stops, leg_hours = self._get_itinerary(trip)
+        events = self.scheduler.schedule(
+            stops,
+            leg_hours,
+            start=self.day_start.hour * 60 + self.day_start.minute,
+            cycle_used=float(trip.current_cycle_used),
+        )
+
         # Calculate number of days needed
-        total_hours = float(trip.estimated_duration)
-        days_needed = int((total_hours + 23) // 24)  # Ceiling division
+        days_needed = -(-events[-1]["end"] // 1440)  # Ceiling division
+        driving_minutes = sum(
+            event["end"] - event["start"]
+            for event in events
+            if event["activity"] == "driving"
+        )
 
         current_date = start_date
-        remaining_hours = total_hours
-
         for day in range(days_needed):
-            # Calculate hours for this day
-            day_hours = min(24, remaining_hours)
-
-            # Create log entry for this day
-            log_entry = self._create_daily_log(trip, current_date, day_hours, day == 0)
+            activity_periods = self._calculate_activity_periods(
+                events, day, is_last_day=day == days_needed - 1
+            )
+            log_entry = self._create_daily_log(
+                trip, current_date, day, activity_periods, driving_minutes
+            )
             logs.append(log_entry)
 
             current_date += timedelta(days=1)
-            remaining_hours -= day_hours
 
+        driver_responses.invalidate(trip.driver_id)
         return logs
 
+    def _get_itinerary(self, trip: Trip) -> Tuple[List[Dict[str, Any]], List[float]]:
+        """
+        Get the ordered stops of a trip and the driving hours between them,
+        scaled to the trip's estimated duration
+        """
+        route = Route.objects.filter(trip=trip).first()
+        stops = route.stops if route else []
+        legs = route.route_data.get("legs", []) if route else []
+
+        if not stops or len(legs) != len(stops) - 1:
+            stops = [
+                {"location": trip.pickup_location, "type": "pickup"},
+                {"location": trip.dropoff_location, "type": "dropoff"},
+            ]
+            legs = [{"duration": float(trip.estimated_duration)}]
+
+        leg_hours = [float(leg["duration"]) for leg in legs]
+        total_hours = sum(leg_hours)
+        if total_hours:
+            scale = float(trip.estimated_duration) / total_hours
+            leg_hours = [hours * scale for hours in leg_hours]
+        return stops, leg_hours
+
     def _create_daily_log(
-        self, trip: Trip, date: datetime.date, day_hours: float, is_first_day: bool
+        self,
+        trip: Trip,
+        date: datetime.date,
+        day: int,
+        activity_periods: List[Dict[str, Any]],
+        trip_driving_minutes: float,
     ) -> LogEntry:
         """Create a single daily log entry"""
-
-        # Calculate activity periods for this day
-        activity_periods = self._calculate_activity_periods(
-            trip, date, day_hours, is_first_day
-        )
+        day_start, day_end = self._get_day_bounds(day)
 
         # Calculate totals
-        total_miles = self._calculate_day_miles(trip, day_hours)
-        total_hours = day_hours
+        driving_hours = sum(
+            period["hours"]
+            for period in activity_periods
+            if period["activity"] == "driving"
+        )
+        total_miles = self._calculate_day_miles(
+            trip, driving_hours, trip_driving_minutes / 60
+        )
+        total_hours = sum(
+            period["hours"]
+            for period in activity_periods
+            if period["activity"] in ("driving", "on_duty_not_driving")
+        )
 
         # Create log entry
         log_entry = LogEntry.objects.create(
             trip=trip,
             date=date,
-            start_time=time(6, 0),  # Start at 6 AM
-            end_time=time(6, 0),  # End at 6 AM next day
+            # The sheet covers the same day its activity periods are clipped to
+            start_time=self._minutes_to_time(day_start),
+            end_time=self._minutes_to_time(day_end),
             total_miles=total_miles,
-            total_hours=total_hours,
+            total_hours=Decimal(str(round(total_hours, 2))),
             driver_name=getattr(trip.driver, "first_name", "Driver")
             + " "
             + getattr(trip.driver, "last_name", ""),
@@ -168,82 +394,100 @@ class HOSService:
             log_data=self._create_log_grid(activity_periods),
         )
 
-        # Create activity periods
-        for period_data in activity_periods:
-            ActivityPeriod.objects.create(log_entry=log_entry, **period_data)
+        # Create activity periods, in one INSERT and without per-row
+        # signals; calculate_trip_logs invalidates cached responses once
+        ActivityPeriod.objects.bulk_create(
+            ActivityPeriod(
+                log_entry=log_entry,
+                activity=period_data["activity"],
+                start_time=period_data["start_time"],
+                end_time=period_data["end_time"],
+                location=period_data["location"],
+                remarks=period_data["remarks"],
+            )
+            for period_data in activity_periods
+        )
 
         return log_entry
 
     def _calculate_activity_periods(
-        self, trip: Trip, date: datetime.date, day_hours: float, is_first_day: bool
+        self, events: List[Dict[str, Any]], day: int, is_last_day: bool
     ) -> List[Dict[str, Any]]:
-        """Calculate activity periods for a day"""
+        """Clip the trip's duty events to a single day"""
         periods = []
+        day_start, day_end = self._get_day_bounds(day)
 
-        if is_first_day:
-            # First day: start with pickup and driving
-            periods.extend(
-                [
-                    {
-                        "activity": "on_duty_not_driving",
-                        "start_time": time(6, 0),
-                        "end_time": time(7, 0),
-                        "location": trip.pickup_location,
-                        "remarks": "Pickup and pre-trip inspection",
-                    },
-                    {
-                        "activity": "driving",
-                        "start_time": time(7, 0),
-                        "end_time": time(18, 0),  # 11 hours driving
-                        "location": f"{trip.pickup_location} to {trip.dropoff_location}",
-                        "remarks": "Driving to destination",
-                    },
-                    {
-                        "activity": "on_duty_not_driving",
-                        "start_time": time(18, 0),
-                        "end_time": time(19, 0),
-                        "location": trip.dropoff_location,
-                        "remarks": "Dropoff and post-trip inspection",
-                    },
-                    {
-                        "activity": "off_duty",
-                        "start_time": time(19, 0),
-                        "end_time": time(6, 0),  # Next day
-                        "location": trip.dropoff_location,
-                        "remarks": "Off duty rest",
-                    },
-                ]
+        trip_start = events[0]["start"]
+        if day_start < trip_start < day_end:
+            # Off duty from midnight until the trip starts
+            periods.append(
+                {
+                    "activity": "off_duty",
+                    "start_time": self._minutes_to_time(0),
+                    "end_time": self._minutes_to_time(trip_start - day_start),
+                    "hours": (trip_start - day_start) / 60,
+                    "location": events[0]["location"],
+                    "remarks": "Off duty rest",
+                }
             )
-        else:
-            # Subsequent days: continue driving
-            periods.extend(
-                [
-                    {
-                        "activity": "driving",
-                        "start_time": time(6, 0),
-                        "end_time": time(17, 0),  # 11 hours driving
-                        "location": f"Continuing to {trip.dropoff_location}",
-                        "remarks": "Driving to destination",
-                    },
-                    {
-                        "activity": "off_duty",
-                        "start_time": time(17, 0),
-                        "end_time": time(6, 0),  # Next day
-                        "location": "Rest area",
-                        "remarks": "Off duty rest",
-                    },
-                ]
+
+        for event in events:
+            start = max(event["start"], day_start)
+            end = min(event["end"], day_end)
+            if start >= end:
+                continue
+            periods.append(
+                {
+                    "activity": event["activity"],
+                    "start_time": self._minutes_to_time(start - day_start),
+                    "end_time": self._minutes_to_time(end - day_start),
+                    "hours": (end - start) / 60,
+                    "location": event["location"],
+                    "remarks": event["remarks"],
+                }
+            )
+
+        trip_end = events[-1]["end"]
+        if is_last_day and trip_end < day_end:
+            # Off duty for the rest of the final day
+            periods.append(
+                {
+                    "activity": "off_duty",
+                    "start_time": self._minutes_to_time(trip_end - day_start),
+                    "end_time": time(0, 0),  # Midnight
+                    "hours": (day_end - trip_end) / 60,
+                    "location": events[-1]["location"],
+                    "remarks": "Off duty rest",
+                }
             )
 
         return periods
 
-    def _calculate_day_miles(self, trip: Trip, day_hours: float) -> Decimal:
+    @staticmethod
+    def _get_day_bounds(day: int) -> Tuple[int, int]:
+        """Trip minutes at which a log day starts and ends, midnight to midnight"""
+        return day * 1440, (day + 1) * 1440
+
+    @staticmethod
+    def _minutes_to_time(minutes: int) -> time:
+        """Convert minutes since midnight to a time of day"""
+        minutes = int(minutes) % 1440
+        return time(minutes // 60, minutes % 60)
+
+    def _calculate_day_miles(
+        self, trip: Trip, driving_hours: float, trip_driving_hours: float
+    ) -> Decimal:
         """Calculate miles driven in a day"""
-        if trip.estimated_distance:
-            # Proportional to hours
-            total_hours = float(trip.estimated_duration)
+        if trip.estimated_distance and trip_driving_hours:
+            # Proportional to driving hours
             return Decimal(
-                str((day_hours / total_hours) * float(trip.estimated_distance))
+                str(
+                    round(
+                        (driving_hours / trip_driving_hours)
+                        * float(trip.estimated_distance),
+                        1,
+                    )
+                )
             )
         return Decimal("0")
 
@@ -270,7 +514,9 @@ class HOSService:
             start_hour = period["start_time"].hour
             end_hour = period["end_time"].hour
 
-            if end_hour < start_hour:  # Crosses midnight
+            # Crosses midnight, or runs midnight to midnight when the times
+            # are equal, as periods are never empty
+            if period["end_time"] <= period["start_time"]:
                 # Fill from start to 23
                 for hour in range(start_hour, 24):
                     grid[f"{hour:02d}:00"] = period["activity"]
@@ -291,6 +537,7 @@ class TripPlanningService:
     def __init__(self):
         self.map_service = MapService()
         self.hos_service = HOSService()
+        self.stop_optimizer = StopSequenceOptimizer()
 
     def plan_trip(self, trip_data: Dict[str, Any]) -> Trip:
         """Plan a complete trip with route and logs"""
@@ -304,10 +551,44 @@ class TripPlanningService:
             current_cycle_used=trip_data["current_cycle_used"],
         )
 
-        # Get route information
-        route_data = self.map_service.get_route(
-            trip.pickup_location, trip.dropoff_location
-        )
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            # Route the empty leg to the pickup while the loaded leg is planned
+            deadhead = None
+            if not self._is_same_location(
+                trip.current_location, trip.pickup_location
+            ):
+                deadhead = executor.submit(
+                    self.map_service.get_route,
+                    trip.current_location,
+                    trip.pickup_location,
+                )
+
+            # Order intermediate pickups and drops
+            stops = self._sequence_stops(trip, trip_data.get("stops") or [])
+            waypoints = [stop["location"] for stop in stops[1:-1]]
+
+            # Get route information
+            route_data = self.map_service.get_route(
+                trip.pickup_location, trip.dropoff_location, waypoints
+            )
+
+            if deadhead:
+                deadhead_data = deadhead.result()
+                route_data = self.map_service.combine_routes(
+                    [deadhead_data, route_data]
+                )
+                route_data["deadhead_distance"] = deadhead_data["distance"]
+                route_data["deadhead_duration"] = deadhead_data["duration"]
+                stops = [
+                    {
+                        "location": trip.current_location,
+                        "type": "start",
+                        "flexible": False,
+                    },
+                    *stops,
+                ]
+                for sequence, stop in enumerate(stops):
+                    stop["sequence"] = sequence
 
         # Update trip with route data
         trip.estimated_distance = route_data["distance"]
@@ -322,10 +603,63 @@ class TripPlanningService:
             total_duration=route_data["duration"],
             rest_stops=route_data["rest_stops"],
             fuel_stops=route_data["fuel_stops"],
+            stops=stops,
         )
 
         return trip
 
+    @staticmethod
+    def _is_same_location(first: str, second: str) -> bool:
+        """Check if two locations refer to the same place"""
+        return first.strip().lower() == second.strip().lower()
+
+    def _sequence_stops(
+        self, trip: Trip, stops: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Build the ordered stop list for a trip, from the pickup location to
+        the dropoff location, reordering flexible intermediate stops to
+        minimize total distance
+        """
+        stops = [
+            {"location": trip.pickup_location, "type": "pickup", "flexible": False},
+            *[
+                {
+                    "location": stop["location"],
+                    "type": stop["type"],
+                    "flexible": stop.get("flexible", True),
+                    **{
+                        key: stop[key].strftime("%H:%M")
+                        for key in ("opens_at", "closes_at")
+                        if stop.get(key)
+                    },
+                }
+                for stop in stops
+            ],
+            {"location": trip.dropoff_location, "type": "dropoff", "flexible": False},
+        ]
+
+        if sum(stop["flexible"] for stop in stops) > 1:
+            matrix = self.map_service.get_distance_matrix(
+                [stop["location"] for stop in stops]
+            )
+            # A dropoff may carry freight from any pickup listed before it
+            precedence = [
+                (before, after)
+                for after, stop in enumerate(stops)
+                if stop["type"] == "dropoff"
+                for before in range(after)
+                if stops[before]["type"] == "pickup"
+            ]
+            order = self.stop_optimizer.optimize(
+                matrix, [not stop["flexible"] for stop in stops], precedence
+            )
+            stops = [stops[index] for index in order]
+
+        for sequence, stop in enumerate(stops):
+            stop["sequence"] = sequence
+        return stops
+
     def generate_logs(self, trip: Trip, start_date: datetime.date) -> List[LogEntry]:
         """Generate all required log entries for a trip"""
         return self.hos_service.calculate_trip_logs(trip, start_date)
@@ -0,0 +1,47 @@
+"""
+Signals for eld app.
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import ActivityPeriod, LogEntry, Route, Trip
+from .cache import driver_responses
+
+
+@receiver(post_save, sender=Trip)
+@receiver(post_delete, sender=Trip)
+def invalidate_trip_responses(sender, instance, **kwargs):
+    """Drop the driver's cached responses when a trip changes"""
+    driver_responses.invalidate(instance.driver_id)
+
+
+@receiver(post_save, sender=Route)
+@receiver(post_delete, sender=Route)
+@receiver(post_save, sender=LogEntry)
+@receiver(post_delete, sender=LogEntry)
+def invalidate_trip_child_responses(sender, instance, **kwargs):
+    """Drop the driver's cached responses when a route or log changes"""
+    if sender.trip.is_cached(instance):
+        driver_responses.invalidate(instance.trip.driver_id)
+        return
+    _invalidate_drivers(Trip.objects.filter(pk=instance.trip_id))
+
+
+@receiver(post_save, sender=ActivityPeriod)
+@receiver(post_delete, sender=ActivityPeriod)
+def invalidate_activity_period_responses(sender, instance, **kwargs):
+    """Drop the driver's cached responses when an activity period changes"""
+    if sender.log_entry.is_cached(instance) and LogEntry.trip.is_cached(
+        instance.log_entry
+    ):
+        driver_responses.invalidate(instance.log_entry.trip.driver_id)
+        return
+    _invalidate_drivers(Trip.objects.filter(log_entries=instance.log_entry_id))
+
+
+def _invalidate_drivers(trips):
+    # Parents deleted in the same cascade are gone already; deleting the
+    # trip itself invalidates its driver
+    for driver_id in trips.values_list("driver_id", flat=True):
+        driver_responses.invalidate(driver_id)
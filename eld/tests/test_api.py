@@ -2,13 +2,29 @@
 Tests for ELD API endpoints.
 """
 
+import json
 from datetime import date
+from unittest import mock
 from decimal import Decimal
+import msgpack
 from core.models import Trip, Route, LogEntry
 from django.urls import reverse
 from rest_framework import status
-from utils.factories import TripFactory, UserFactory
+from rest_framework.parsers import JSONParser
+from rest_framework.request import Empty, Request
+from rest_framework.test import APIRequestFactory
+from utils.geometry import encode_polyline
+from eld.throttles import DriverThrottle
+from eld.views import LogEntryViewSet
+from utils.factories import (
+    ActivityPeriodFactory,
+    LogEntryFactory,
+    RouteFactory,
+    TripFactory,
+    UserFactory,
+)
 from utils.helpers import TestCaseHelper
+from utils.renderer import ResponseRenderer
 
 # URL patterns for ELD API
 trip_list_url = "/api/v1/eld/trips/"
@@ -19,6 +35,7 @@ log_entry_list_url = "/api/v1/eld/log-entries/"
 log_entry_detail_url = "/api/v1/eld/log-entries/{}/"
 route_list_url = "/api/v1/eld/routes/"
 route_detail_url = "/api/v1/eld/routes/{}/"
+route_map_data_url = "/api/v1/eld/routes/{}/map_data/"
 
 
 class TestTripAPI(TestCaseHelper):
@@ -114,6 +131,153 @@ class TestTripAPI(TestCaseHelper):
         response = client.get(trip_detail_url.format(other_trip.uid))
         self.assertEqual(response.status_code, 404)
 
+    def test_trip_create_rejects_script_in_json_body(self, test_driver):
+        """Test XSS fragments nested in JSON bodies are rejected"""
+        trip_data = {
+            "current_location": "New York, NY",
+            "pickup_location": "Boston, MA",
+            "dropoff_location": "Philadelphia, PA",
+            "current_cycle_used": "25.50",
+            "stops": [{"location": "Dock <SCRIPT>alert(1)</script>"}],
+        }
+
+        client = self.get_authenticated_client(test_driver)
+        response = client.post(trip_list_url, data=trip_data, format="json")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("XSS_DETECTED", response.data)
+        self.assertFalse(Trip.objects.exists())
+
+    def test_trip_create_xss_check_handles_big_integers(self, test_driver):
+        """Test integers wider than 64 bits are scanned, not a server error"""
+        trip_data = {
+            "current_location": "New York, NY",
+            "pickup_location": "Boston, MA",
+            "dropoff_location": "Philadelphia, PA",
+            "current_cycle_used": "25.50",
+            "stops": [{"location": "Dock <script>", "ref": 2**70}],
+        }
+
+        client = self.get_authenticated_client(test_driver)
+        response = client.post(trip_list_url, data=trip_data, format="json")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("XSS_DETECTED", response.data)
+
+    def test_trip_detail_not_modified(self, test_driver, test_trip):
+        """Test trip detail answers 304 when the client's copy is current"""
+        client = self.get_authenticated_client(test_driver)
+        response = client.get(trip_detail_url.format(test_trip.uid))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Last-Modified", response)
+
+        response = client.get(
+            trip_detail_url.format(test_trip.uid),
+            HTTP_IF_NONE_MATCH=response["ETag"],
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_trip_logs_etag_changes_with_activity(
+        self, test_driver, test_trip, test_log_entry
+    ):
+        """Test trip logs ETag changes when an activity period is added"""
+        url = f"{trip_detail_url.format(test_trip.uid)}logs/"
+        client = self.get_authenticated_client(test_driver)
+        etag = client.get(url)["ETag"]
+
+        ActivityPeriodFactory.create(log_entry=test_log_entry)
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(len(response.data[0]["activity_periods"]), 1)
+
+    def test_trip_route_not_modified(self, test_driver, test_trip):
+        """Test trip route answers 304 until the route changes"""
+        route = RouteFactory.create(trip=test_trip)
+        url = f"{trip_detail_url.format(test_trip.uid)}route/"
+        client = self.get_authenticated_client(test_driver)
+        etag = client.get(url)["ETag"]
+
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        route.total_distance = Decimal("42.00")
+        route.save()
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_trip_logs_served_from_cache(
+        self, test_driver, test_trip, test_log_entry, django_assert_num_queries
+    ):
+        """Test cached trip logs skip the log queries but keep the envelope"""
+        url = f"{trip_detail_url.format(test_trip.uid)}logs/"
+        client = self.get_authenticated_client(test_driver)
+        first = client.get(url)
+
+        # Only the trip and version stamp lookups remain, the user is cached
+        with django_assert_num_queries(2):
+            second = client.get(url)
+
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second.json()["data"][0]["uid"], str(test_log_entry.uid))
+
+    def test_trip_logs_cache_invalidated_on_change(
+        self, test_driver, test_trip, test_log_entry
+    ):
+        """Test saving an activity period drops the driver's cached logs"""
+        url = f"{trip_detail_url.format(test_trip.uid)}logs/"
+        client = self.get_authenticated_client(test_driver)
+        client.get(url)
+
+        ActivityPeriodFactory.create(log_entry=test_log_entry)
+        response = client.get(url)
+
+        self.assertEqual(len(response.json()["data"][0]["activity_periods"]), 1)
+
+
+class TestMessagePackAPI(TestCaseHelper):
+    """Test MessagePack content negotiation"""
+
+    def test_trip_list_as_msgpack(self, test_driver, test_trip):
+        """Test trips are rendered as MessagePack when accepted"""
+        client = self.get_authenticated_client(test_driver)
+        response = client.get(trip_list_url, HTTP_ACCEPT="application/msgpack")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/msgpack")
+        body = msgpack.unpackb(response.content)
+        self.assertEqual(body["message"], "Success")
+        self.assertEqual(body["data"][0]["uid"], str(test_trip.uid))
+
+    def test_trip_create_from_msgpack(self, test_driver):
+        """Test trips can be created from a MessagePack body"""
+        trip_data = {
+            "current_location": "New York, NY",
+            "pickup_location": "Boston, MA",
+            "dropoff_location": "Philadelphia, PA",
+            "current_cycle_used": "25.50",
+        }
+
+        client = self.get_authenticated_client(test_driver)
+        response = client.post(
+            trip_list_url,
+            data=msgpack.packb(trip_data),
+            content_type="application/msgpack",
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["pickup_location"], "Boston, MA")
+
+    def test_invalid_msgpack_body(self, test_driver):
+        """Test malformed MessagePack bodies are rejected"""
+        client = self.get_authenticated_client(test_driver)
+        response = client.post(
+            trip_list_url, data=b"\xc1", content_type="application/msgpack"
+        )
+
+        self.assertEqual(response.status_code, 400)
+
 
 class TestTripPlanningAPI(TestCaseHelper):
     """Test trip planning functionality"""
@@ -149,6 +313,44 @@ class TestTripPlanningAPI(TestCaseHelper):
         self.assertEqual(response.status_code, 401)
 
 
+class TestDriverThrottle(TestCaseHelper):
+    """Test tiered per-driver rate limits"""
+
+    def test_planning_throttled_separately_from_reads(self, test_driver):
+        """Test planning has its own limit that reads do not consume"""
+        plan_data = {
+            "current_location": "New York, NY",
+            "pickup_location": "Boston, MA",
+            "dropoff_location": "Philadelphia, PA",
+            "current_cycle_used": "25.50",
+        }
+        client = self.get_authenticated_client(test_driver)
+
+        rates = {"eld_planning": "1/1m", "eld_read": "2/1m"}
+        with mock.patch.dict(DriverThrottle.THROTTLE_RATES, rates):
+            self.assertEqual(client.get(trip_list_url).status_code, 200)
+            response = client.post(trip_plan_url, data=plan_data)
+            self.assertEqual(response.status_code, 201)
+            response = client.post(trip_plan_url, data=plan_data)
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(client.get(trip_list_url).status_code, 200)
+
+    def test_cache_key_does_not_parse_body(self, test_driver):
+        """Test the throttle identity comes from the user, not the body"""
+        request = Request(
+            APIRequestFactory().post(
+                trip_list_url, data="{", content_type="application/json"
+            ),
+            parsers=[JSONParser()],
+        )
+        request.user = test_driver
+
+        key = DriverThrottle().get_cache_key(request, None)
+
+        self.assertIn(str(test_driver.pk), key)
+        assert request._data is Empty
+
+
 class TestLogGenerationAPI(TestCaseHelper):
     """Test log generation functionality"""
 
@@ -202,6 +404,31 @@ class TestLogEntryAPI(TestCaseHelper):
         self.assertEqual(len(response.data), 1)
         self.assertEqual(response.data[0]["uid"], str(test_log_entry.uid))
 
+    def test_log_entry_list_omits_log_data(self, test_driver, test_log_entry):
+        """Test log entry list skips the hourly grid that detail returns"""
+        client = self.get_authenticated_client(test_driver)
+        list_response = client.get(log_entry_list_url)
+        detail_response = client.get(log_entry_detail_url.format(test_log_entry.uid))
+
+        self.assertFalse("log_data" in list_response.data[0])
+        self.assertEqual(detail_response.data["log_data"], test_log_entry.log_data)
+
+    def test_log_entry_list_streamed(self, test_driver, test_trip):
+        """Test streamed log entry list matches the regular list"""
+        for day in (1, 2, 3):
+            LogEntryFactory.create(trip=test_trip, date=date(2025, 1, day))
+        client = self.get_authenticated_client(test_driver)
+
+        # Batches smaller than the result exercise the separators
+        with mock.patch.object(LogEntryViewSet, "stream_chunk_size", 2):
+            response = client.get(log_entry_list_url, data={"stream": "true"})
+        regular = client.get(log_entry_list_url)
+
+        self.assertTrue(response.streaming)
+        body = json.loads(b"".join(response.streaming_content))
+        self.assertEqual(body, regular.json())
+        self.assertEqual(len(body["data"]), 3)
+
     def test_log_entry_detail_authenticated_user(self, test_driver, test_log_entry):
         """Test authenticated user can view log entry details"""
         client = self.get_authenticated_client(test_driver)
@@ -223,6 +450,33 @@ class TestRouteAPI(TestCaseHelper):
         self.assertEqual(len(response.data), 1)
         self.assertEqual(response.data[0]["uid"], str(test_route.uid))
 
+    def test_route_list_omits_route_data(self, test_driver, test_route):
+        """Test route list skips route data, rest stops and fuel stops"""
+        client = self.get_authenticated_client(test_driver)
+        response = client.get(route_list_url)
+
+        for field in ("route_data", "rest_stops", "fuel_stops"):
+            self.assertFalse(field in response.data[0])
+        self.assertIn("total_distance", response.data[0])
+
+    def test_route_with_big_integers_rendered(self, test_driver, test_trip):
+        """Test integers wider than 64 bits render instead of a server error"""
+        route = RouteFactory.create(trip=test_trip, route_data={"ref": 2**70})
+
+        client = self.get_authenticated_client(test_driver)
+        response = client.get(route_detail_url.format(route.uid))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            json.loads(response.content)["data"]["route_data"]["ref"], 2**70
+        )
+
+        # Streamed lists encode each row through the same path
+        self.assertEqual(
+            ResponseRenderer().encode([{"ref": 2**70}]),
+            b'[{"ref":1180591620717411303424}]',
+        )
+
     def test_route_detail_authenticated_user(self, test_driver, test_route):
         """Test authenticated user can view route details"""
         client = self.get_authenticated_client(test_driver)
@@ -230,3 +484,50 @@ class TestRouteAPI(TestCaseHelper):
 
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.data["uid"], str(test_route.uid))
+
+    def test_route_map_data_decodes_geometry(self, test_driver, test_trip):
+        """Test map data returns decoded coordinates for the route"""
+        route = RouteFactory.create(
+            trip=test_trip,
+            route_data={"geometry": encode_polyline([(42.36, -71.06), (39.95, -75.17)])},
+        )
+
+        client = self.get_authenticated_client(test_driver)
+        response = client.get(route_map_data_url.format(route.uid))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data["geometry"], [(42.36, -71.06), (39.95, -75.17)]
+        )
+        self.assertFalse("geometry" in response.data["route_data"])
+
+    def test_route_map_data_simplifies_for_zoom(self, test_driver, test_trip):
+        """Test map data returns fewer points for a zoomed-out map"""
+        coordinates = [
+            (round(42.36 - i * 0.0003, 5), round(-71.06 - i * 0.0004, 5))
+            for i in range(1000)
+        ]
+        route = RouteFactory.create(
+            trip=test_trip,
+            route_data={"geometry": encode_polyline(coordinates)},
+        )
+
+        client = self.get_authenticated_client(test_driver)
+        response = client.get(
+            route_map_data_url.format(route.uid), data={"zoom": 6}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        geometry = response.data["geometry"]
+        self.assertTrue(len(geometry) < 10)
+        self.assertEqual(geometry[0], coordinates[0])
+        self.assertEqual(geometry[-1], coordinates[-1])
+
+    def test_route_map_data_invalid_tolerance(self, test_driver, test_route):
+        """Test map data rejects a negative tolerance"""
+        client = self.get_authenticated_client(test_driver)
+        response = client.get(
+            route_map_data_url.format(test_route.uid), data={"tolerance": -1}
+        )
+
+        self.assertEqual(response.status_code, 400)
@@ -2,11 +2,19 @@
 Tests for ELD services business logic.
 """
 
-from datetime import date
+import math
+from datetime import date, time as time_of_day
 from decimal import Decimal
-from core.models import Route, LogEntry
-from eld.services import TripPlanningService
+
+import responses
+from core.models import ActivityPeriod, LogEntry, Route, Trip
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from eld.optimizers import BreakScheduler, StopSequenceOptimizer
+from eld.services import HOSService, MapService, TripPlanningService
 from utils.factories import TripFactory
+from utils.geometry import decode_polyline
 from utils.helpers import TestCaseHelper
 
 
@@ -64,3 +72,343 @@ class TestTripPlanningService(TestCaseHelper):
 
         # Long trips should generate multiple log entries
         self.assertTrue(len(log_entries) > 1)
+
+    def test_log_window_matches_its_activity_periods(self, test_driver):
+        """Test each log sheet spans the day its periods are clipped to"""
+        # A 34-hour restart then takes the whole of the second day
+        trip = TripFactory.create(
+            driver=test_driver,
+            estimated_duration=Decimal("30.00"),
+            current_cycle_used=Decimal("60.00"),
+        )
+
+        log_entries = TripPlanningService().generate_logs(trip, date.today())
+
+        for log_entry in log_entries:
+            self.assertEqual(log_entry.start_time, time_of_day(0, 0))
+            self.assertEqual(log_entry.end_time, time_of_day(0, 0))
+            hours = sum(
+                period.duration_hours
+                for period in log_entry.activity_periods.all()
+            )
+            self.assertEqual(round(hours, 2), 24)
+
+    def test_generate_logs_invalidates_without_queries_per_period(
+        self, test_driver
+    ):
+        """Test periods are inserted per day and trips are never looked up"""
+        trip = TripFactory.create(
+            driver=test_driver, estimated_duration=Decimal("30.00")
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            log_entries = TripPlanningService().generate_logs(trip, date.today())
+
+        statements = [query["sql"] for query in queries]
+        period_inserts = [
+            sql
+            for sql in statements
+            if sql.startswith("INSERT") and ActivityPeriod._meta.db_table in sql
+        ]
+        self.assertEqual(len(period_inserts), len(log_entries))
+        self.assertFalse(
+            any(
+                sql.startswith("SELECT") and Trip._meta.db_table in sql
+                for sql in statements
+            )
+        )
+
+    def test_log_grid_fills_a_whole_day_period(self):
+        """Test a midnight to midnight period fills every hour of the grid"""
+        grid = HOSService()._create_log_grid(
+            [
+                {
+                    "activity": "sleeper_berth",
+                    "start_time": time_of_day(0, 0),
+                    "end_time": time_of_day(0, 0),
+                }
+            ]
+        )
+
+        self.assertEqual(set(grid.values()), {"sleeper_berth"})
+        self.assertEqual(len(grid), 24)
+
+    def test_plan_trip_with_stops_routes_through_waypoints(self, test_driver):
+        """Test that intermediate stops are stored on the route in order"""
+        trip_data = {
+            "driver": test_driver,
+            "current_location": "New York, NY",
+            "pickup_location": "Boston, MA",
+            "dropoff_location": "Philadelphia, PA",
+            "current_cycle_used": Decimal("25.50"),
+            "stops": [
+                {"location": "Hartford, CT", "type": "pickup", "flexible": False},
+                {"location": "Newark, NJ", "type": "dropoff", "flexible": False},
+            ],
+        }
+
+        trip = TripPlanningService().plan_trip(trip_data)
+
+        locations = [stop["location"] for stop in trip.route.stops]
+        self.assertEqual(
+            locations,
+            [
+                "New York, NY",
+                "Boston, MA",
+                "Hartford, CT",
+                "Newark, NJ",
+                "Philadelphia, PA",
+            ],
+        )
+        self.assertEqual(len(trip.route.route_data["legs"]), 4)
+        self.assertEqual(trip.estimated_distance, Decimal("2000.00"))
+
+    def test_plan_trip_includes_deadhead_leg(self, test_driver):
+        """Test that the empty leg to the pickup is part of the route"""
+        trip_data = {
+            "driver": test_driver,
+            "current_location": "New York, NY",
+            "pickup_location": "Boston, MA",
+            "dropoff_location": "Philadelphia, PA",
+            "current_cycle_used": Decimal("25.50"),
+        }
+
+        trip = TripPlanningService().plan_trip(trip_data)
+
+        route_data = trip.route.route_data
+        self.assertEqual(route_data["deadhead_distance"], 500.0)
+        self.assertEqual(route_data["waypoints"][0]["location"], "New York, NY")
+        self.assertEqual(trip.estimated_distance, Decimal("1000.00"))
+        self.assertEqual(trip.estimated_duration, Decimal("17.00"))
+
+    def test_plan_trip_skips_deadhead_at_pickup(self, test_driver):
+        """Test that no empty leg is routed when already at the pickup"""
+        trip_data = {
+            "driver": test_driver,
+            "current_location": "Boston, MA",
+            "pickup_location": "Boston, MA",
+            "dropoff_location": "Philadelphia, PA",
+            "current_cycle_used": Decimal("25.50"),
+        }
+
+        trip = TripPlanningService().plan_trip(trip_data)
+
+        self.assertFalse("deadhead_distance" in trip.route.route_data)
+        self.assertEqual(trip.estimated_distance, Decimal("500.00"))
+
+    def test_generate_logs_for_planned_trip(self, test_driver):
+        """Test that logs cover the deadhead and loaded legs of a plan"""
+        trip_data = {
+            "driver": test_driver,
+            "current_location": "New York, NY",
+            "pickup_location": "Boston, MA",
+            "dropoff_location": "Philadelphia, PA",
+            "current_cycle_used": Decimal("25.50"),
+        }
+        planning_service = TripPlanningService()
+        trip = planning_service.plan_trip(trip_data)
+
+        log_entries = planning_service.generate_logs(trip, date.today())
+
+        driving_hours = sum(
+            period.duration_hours
+            for log_entry in log_entries
+            for period in log_entry.activity_periods.filter(activity="driving")
+        )
+        self.assertEqual(driving_hours, 17.0)
+
+
+class TestMapService(TestCaseHelper):
+    """Test map service route calculations"""
+
+    def test_get_route_sums_legs_through_waypoints(self):
+        """Test that waypoints add a leg each to the route"""
+        route_data = MapService().get_route(
+            "Boston, MA", "Philadelphia, PA", ["Hartford, CT"]
+        )
+
+        self.assertEqual(route_data["distance"], 1000.0)
+        self.assertEqual(route_data["duration"], 17.0)
+        self.assertEqual(route_data["waypoints"][1]["type"], "waypoint")
+
+
+    @responses.activate
+    def test_get_route_uses_provider_when_configured(self, settings):
+        """Test that legs are routed through the provider API"""
+        settings.OPENROUTESERVICE_API_KEY = "test-key"
+        responses.get(
+            "https://api.openrouteservice.org/geocode/search",
+            json={"features": [{"geometry": {"coordinates": [-71.06, 42.36]}}]},
+        )
+        responses.get(
+            "https://api.openrouteservice.org/v2/directions/driving-hgv",
+            json={
+                "features": [
+                    {
+                        "properties": {
+                            "summary": {"distance": 482803.2, "duration": 19800}
+                        },
+                        "geometry": {
+                            "coordinates": [[-71.06, 42.36], [-75.17, 39.95]]
+                        },
+                    }
+                ]
+            },
+        )
+
+        route_data = MapService().get_route("Boston, MA", "Philadelphia, PA")
+
+        self.assertEqual(route_data["distance"], 300.0)
+        self.assertEqual(route_data["duration"], 5.5)
+        self.assertEqual(
+            decode_polyline(route_data["geometry"]),
+            [(42.36, -71.06), (39.95, -75.17)],
+        )
+        self.assertFalse("geometry" in route_data["legs"][0])
+
+
+    @responses.activate
+    def test_distance_matrix_fetched_in_one_call(self, settings):
+        """Test a matrix of N stops makes one matrix call and N geocodes"""
+        cache.clear()
+        settings.OPENROUTESERVICE_API_KEY = "test-key"
+        geocode = responses.get(
+            "https://api.openrouteservice.org/geocode/search",
+            json={"features": [{"geometry": {"coordinates": [-71.06, 42.36]}}]},
+        )
+        matrix = responses.post(
+            "https://api.openrouteservice.org/v2/matrix/driving-hgv",
+            json={"distances": [[0, 100, 200, None]] * 4},
+        )
+        locations = ["Boston, MA", "Hartford, CT", "Newark, NJ", "Dover, DE"]
+
+        distances = MapService().get_distance_matrix(locations)
+        self.assertEqual(geocode.call_count, 4)
+        self.assertEqual(matrix.call_count, 1)
+        self.assertEqual(distances[1], [0, 100, 200, math.inf])
+
+        # Other requests reuse the shared cache
+        MapService().get_distance_matrix(locations)
+        self.assertEqual(geocode.call_count, 4)
+
+
+class TestStopSequenceOptimizer:
+    """Test stop ordering heuristics"""
+
+    # Stops on a line at the given mile markers
+    positions = [0, 40, 10, 30, 20, 50]
+
+    def get_matrix(self):
+        return [[abs(a - b) for b in self.positions] for a in self.positions]
+
+    def test_flexible_stops_are_reordered(self):
+        """Test that flexible stops are visited in the shortest order"""
+        optimizer = StopSequenceOptimizer()
+        order = optimizer.optimize(self.get_matrix(), [False] * 6)
+
+        assert order == [0, 2, 4, 3, 1, 5]
+        assert optimizer.route_distance(self.get_matrix(), order) == 50
+
+    def test_fixed_stops_keep_their_position(self):
+        """Test that fixed stops split the route into segments"""
+        fixed = [False, False, False, True, False, False]
+        order = StopSequenceOptimizer().optimize(self.get_matrix(), fixed)
+
+        assert order[3] == 3
+        assert order == [0, 2, 1, 3, 4, 5]
+
+    def test_dropoffs_stay_after_their_pickups(self):
+        """Test the shortest order is skipped when it breaks precedence"""
+        # By distance alone the drop at mile 10 comes before the pickup at 40
+        positions = [0, 40, 10, 50]
+        matrix = [[abs(a - b) for b in positions] for a in positions]
+        optimizer = StopSequenceOptimizer()
+
+        assert optimizer.optimize(matrix, [False] * 4) == [0, 2, 1, 3]
+        assert optimizer.optimize(matrix, [False] * 4, [(1, 2)]) == [0, 1, 2, 3]
+
+        predecessors = {0: set(), 1: set(), 2: {1}, 3: set()}
+        path = optimizer._two_opt(matrix, [0, 1, 2, 3], predecessors, math.inf)
+        assert path == [0, 1, 2, 3]
+
+
+class TestBreakScheduler:
+    """Test HOS break and reset placement"""
+
+    stops = [
+        {"location": "Boston, MA", "type": "pickup"},
+        {"location": "Philadelphia, PA", "type": "dropoff"},
+    ]
+
+    def get_totals(self, events, activity):
+        return sum(
+            event["end"] - event["start"]
+            for event in events
+            if event["activity"] == activity
+        )
+
+    def test_long_trip_stays_within_driving_limits(self):
+        """Test that breaks and resets keep every shift compliant"""
+        events = BreakScheduler().schedule(self.stops, [30], start=360)
+
+        shift_driving = since_break = 0
+        for event in events:
+            minutes = event["end"] - event["start"]
+            if event["activity"] == "driving":
+                shift_driving += minutes
+                since_break += minutes
+            elif minutes >= 600:
+                shift_driving = since_break = 0
+            elif minutes >= 30:
+                since_break = 0
+            assert shift_driving <= 11 * 60
+            assert since_break <= 8 * 60
+
+        assert self.get_totals(events, "driving") == 30 * 60
+        # 30 hours of driving needs two resets and two breaks
+        assert events[-1]["end"] == 360 + 60 + 30 * 60 + 2 * 600 + 2 * 30 + 60
+
+    def test_short_trip_needs_no_rest(self):
+        """Test that a trip under the break threshold drives straight through"""
+        events = BreakScheduler().schedule(self.stops, [7.5], start=360)
+
+        assert [event["activity"] for event in events] == [
+            "on_duty_not_driving",
+            "driving",
+            "on_duty_not_driving",
+        ]
+
+    def test_reset_is_placed_to_meet_opening_hours(self):
+        """Test that the schedule waits for the dropoff to open"""
+        stops = [
+            self.stops[0],
+            {**self.stops[1], "opens_at": "08:00", "closes_at": "12:00"},
+        ]
+        events = BreakScheduler().schedule(stops, [12], start=360)
+
+        dropoff = events[-1]
+        assert dropoff["start"] == 1440 + 8 * 60
+        assert self.get_totals(events, "sleeper_berth") == 600
+
+    def test_overnight_opening_hours_are_met(self):
+        """Test that a window closing before it opens runs overnight"""
+        stops = [
+            self.stops[0],
+            {**self.stops[1], "opens_at": "22:00", "closes_at": "06:00"},
+        ]
+        events = BreakScheduler().schedule(stops, [4], start=360)
+
+        dropoff = events[-1]
+        assert dropoff["start"] == 22 * 60
+
+        # Already inside the window after midnight, so no wait
+        events = BreakScheduler().schedule(stops, [1], start=60)
+        assert events[-1]["start"] == 60 + 60 + 60
+
+    def test_exhausted_cycle_takes_restart(self):
+        """Test that a driver out of cycle hours takes a 34-hour restart"""
+        events = BreakScheduler().schedule(
+            self.stops, [8], start=360, cycle_used=68
+        )
+
+        assert "34-hour restart" in [event["remarks"] for event in events]
@@ -0,0 +1,29 @@
+from rest_framework.permissions import SAFE_METHODS
+
+from utils.throttles import BaseThrottle
+
+
+class DriverThrottle(BaseThrottle):
+    """
+    Per-driver limits for the ELD endpoints, tiered by cost: reads,
+    writes, and planning actions that call the routing provider.
+    """
+
+    planning_actions = ("plan_trip", "generate_logs")
+
+    def __init__(self):
+        # The scope, and so the rate, depends on the request
+        pass
+
+    def allow_request(self, request, view):
+        self.scope = self.get_scope(request, view)
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return super().allow_request(request, view)
+
+    def get_scope(self, request, view):
+        if getattr(view, "action", None) in self.planning_actions:
+            return "eld_planning"
+        if request.method in SAFE_METHODS:
+            return "eld_read"
+        return "eld_write"
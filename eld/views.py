@@ -1,3 +1,5 @@
+from django.core.cache import cache
+from django.db.models import Count, Max, Prefetch
 from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -10,20 +12,40 @@ from rest_framework.mixins import (
 )
 
 from core.models import Trip, Route, LogEntry
-from utils.views import BaseAuthenticatedViewSet
+from utils.geometry import (
+    ZOOM_LEVELS,
+    build_levels_of_detail,
+    decode_polyline,
+    simplify_polyline,
+)
+from utils.views import (
+    BaseAuthenticatedViewSet,
+    ConditionalGetMixin,
+    StreamingListMixin,
+)
 from .serializers import (
     TripSerializer,
+    TripListSerializer,
     TripCreateSerializer,
     TripPlanRequestSerializer,
     LogGenerationRequestSerializer,
     LogEntrySerializer,
+    LogEntryListSerializer,
     RouteSerializer,
+    RouteListSerializer,
+    MapDataQuerySerializer,
 )
+from .cache import driver_responses
 from .services import TripPlanningService
+from .throttles import DriverThrottle
+
+ROUTE_GEOMETRY_CACHE_TIMEOUT = 60 * 60 * 24
 
 
 class TripViewSet(
     BaseAuthenticatedViewSet,
+    ConditionalGetMixin,
+    StreamingListMixin,
     ListModelMixin,
     RetrieveModelMixin,
     CreateModelMixin,
@@ -33,14 +55,30 @@ class TripViewSet(
     """ViewSet for managing trips"""
 
     serializer_class = TripSerializer
+    throttle_classes = [DriverThrottle]
     queryset = Trip.objects.all()
 
     def get_queryset(self):
-        return self.queryset.filter(driver=self.request.user)
+        queryset = self.queryset.filter(driver=self.request.user)
+        if self.action == "list":
+            queryset = (
+                queryset.select_related("route")
+                .defer(*[f"route__{field}" for field in Route.HEAVY_FIELDS])
+                .prefetch_related(
+                    Prefetch(
+                        "log_entries",
+                        queryset=LogEntry.objects.without_heavy_fields(),
+                    ),
+                    "log_entries__activity_periods",
+                )
+            )
+        return queryset
 
     def get_serializer_class(self):
         if self.action == "create":
             return TripCreateSerializer
+        if self.action == "list":
+            return TripListSerializer
         return TripSerializer
 
     def perform_create(self, serializer):
@@ -69,6 +107,7 @@ class TripViewSet(
                     "current_cycle_used": serializer.validated_data[
                         "current_cycle_used"
                     ],
+                    "stops": serializer.validated_data.get("stops", []),
                 }
 
                 # Plan the trip
@@ -124,26 +163,90 @@ class TripViewSet(
         trip = self.get_object()
         try:
             route = trip.route
-            serializer = RouteSerializer(route, context={"request": request})
-            return Response(serializer.data, status=status.HTTP_200_OK)
         except Route.DoesNotExist:
             return Response(
                 {"error": "Route not found"}, status=status.HTTP_404_NOT_FOUND
             )
 
+        return self.get_conditional_response(
+            request,
+            self.get_etag(request, "route", route.uid, route.updated_at),
+            route.updated_at,
+            lambda: driver_responses.get_or_build(
+                request,
+                trip.driver_id,
+                f"trip-route:{trip.uid}",
+                lambda: Response(
+                    RouteSerializer(route, context={"request": request}).data,
+                    status=status.HTTP_200_OK,
+                ),
+            ),
+        )
+
     @action(detail=True, methods=["get"])
     def logs(self, request, pk=None):
         """Get log entries for a trip"""
         trip = self.get_object()
-        log_entries = trip.log_entries.all()
-        serializer = LogEntrySerializer(
-            log_entries, many=True, context={"request": request}
+        stamps = self._get_version_stamps(trip, include_route=False)
+
+        def build():
+            log_entries = trip.log_entries.prefetch_related("activity_periods")
+            serializer = LogEntrySerializer(
+                log_entries, many=True, context={"request": request}
+            )
+            return Response(serializer.data, status=status.HTTP_200_OK)
+
+        return self.get_conditional_response(
+            request,
+            self.get_etag(request, "logs", trip.uid, *stamps.values()),
+            self._get_last_modified(trip, stamps),
+            lambda: driver_responses.get_or_build(
+                request, trip.driver_id, f"trip-logs:{trip.uid}", build
+            ),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        trip = self.get_object()
+        stamps = self._get_version_stamps(trip)
+
+        return self.get_conditional_response(
+            request,
+            self.get_etag(
+                request, "trip", trip.uid, trip.updated_at, *stamps.values()
+            ),
+            self._get_last_modified(trip, stamps),
+            lambda: Response(self.get_serializer(trip).data),
+        )
+
+    def _get_version_stamps(self, trip, include_route=True):
+        """
+        Latest update and row count of the trip's children, in one query.
+        Counts catch deletions that leave the latest update unchanged.
+        """
+        stamps = {
+            "logs": Count("log_entries", distinct=True),
+            "logs_updated_at": Max("log_entries__updated_at"),
+            "periods": Count("log_entries__activity_periods", distinct=True),
+            "periods_updated_at": Max("log_entries__activity_periods__updated_at"),
+        }
+        if include_route:
+            stamps["route_updated_at"] = Max("route__updated_at")
+        return Trip.objects.filter(pk=trip.pk).aggregate(**stamps)
+
+    def _get_last_modified(self, trip, stamps):
+        return max(
+            [trip.updated_at]
+            + [
+                value
+                for key, value in stamps.items()
+                if key.endswith("_updated_at") and value
+            ]
         )
-        return Response(serializer.data, status=status.HTTP_200_OK)
 
 
 class LogEntryViewSet(
     BaseAuthenticatedViewSet,
+    StreamingListMixin,
     ListModelMixin,
     RetrieveModelMixin,
     CreateModelMixin,
@@ -153,10 +256,21 @@ class LogEntryViewSet(
     """ViewSet for managing log entries"""
 
     serializer_class = LogEntrySerializer
+    throttle_classes = [DriverThrottle]
     queryset = LogEntry.objects.all()
 
     def get_queryset(self):
-        return self.queryset.filter(trip__driver=self.request.user)
+        queryset = self.queryset.filter(trip__driver=self.request.user)
+        if self.action == "list":
+            queryset = queryset.without_heavy_fields().prefetch_related(
+                "activity_periods"
+            )
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action == "list":
+            return LogEntryListSerializer
+        return LogEntrySerializer
 
     @action(detail=True, methods=["get"])
     def download_pdf(self, request, pk=None):
@@ -181,6 +295,7 @@ class LogEntryViewSet(
 
 class RouteViewSet(
     BaseAuthenticatedViewSet,
+    StreamingListMixin,
     ListModelMixin,
     RetrieveModelMixin,
     CreateModelMixin,
@@ -190,20 +305,60 @@ class RouteViewSet(
     """ViewSet for managing routes"""
 
     serializer_class = RouteSerializer
+    throttle_classes = [DriverThrottle]
     queryset = Route.objects.all()
 
     def get_queryset(self):
-        return self.queryset.filter(trip__driver=self.request.user)
+        queryset = self.queryset.filter(trip__driver=self.request.user)
+        if self.action == "list":
+            queryset = queryset.without_heavy_fields()
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action == "list":
+            return RouteListSerializer
+        return RouteSerializer
 
     @action(detail=True, methods=["get"])
     def map_data(self, request, pk=None):
         """Get map data for a route"""
         route = self.get_object()
+        query = MapDataQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+
         map_data = {
-            "route_data": route.route_data,
+            "route_data": {
+                key: value
+                for key, value in route.route_data.items()
+                if key != "geometry"
+            },
+            "geometry": self._get_geometry(route, **query.validated_data),
             "rest_stops": route.rest_stops,
             "fuel_stops": route.fuel_stops,
             "total_distance": route.total_distance,
             "total_duration": route.total_duration,
         }
         return Response(map_data, status=status.HTTP_200_OK)
+
+    def _get_geometry(self, route, zoom=None, tolerance=None):
+        """
+        Route coordinates simplified for the requested zoom level or
+        tolerance (degrees); full geometry when neither is given
+        """
+        if tolerance is not None:
+            return simplify_polyline(route.coordinates, tolerance)
+        if zoom is None or zoom > max(ZOOM_LEVELS):
+            return route.coordinates
+
+        # Levels of detail are computed once per route version
+        key = f"route-geometry:{route.uid}:{route.updated_at.timestamp()}"
+        levels = cache.get(key)
+        if levels is None:
+            levels = build_levels_of_detail(route.coordinates)
+            cache.set(key, levels, timeout=ROUTE_GEOMETRY_CACHE_TIMEOUT)
+
+        level = max(
+            [level for level in ZOOM_LEVELS if level <= zoom],
+            default=min(ZOOM_LEVELS),
+        )
+        return decode_polyline(levels[level])
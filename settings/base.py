@@ -15,6 +15,7 @@ import os
 from datetime import timedelta
 from pathlib import Path
 from celery.schedules import crontab
+from kombu import Exchange, Queue
 import redis
 
 logger = logging.getLogger(__name__)
@@ -206,6 +207,8 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 AWS_REGION = os.getenv("AWS_REGION")
 AWS_ACCESS_KEY_ID = os.environ.get("AWS_ACCESS_KEY_ID")
 AWS_SECRET_ACCESS_KEY = os.environ.get("AWS_SECRET_ACCESS_KEY")
+# Connections kept per pooled client, see utils.api.aws.client.AWSClient
+AWS_MAX_POOL_CONNECTIONS = int(os.getenv("AWS_MAX_POOL_CONNECTIONS", 50))
 AWS_STORAGE_BUCKET_NAME = os.environ.get("AWS_STORAGE_BUCKET_NAME")
 AWS_S3_REGION_NAME = os.environ.get("AWS_S3_REGION_NAME", "us-east-1")
 AWS_S3_CUSTOM_DOMAIN = os.environ.get("AWS_S3_CUSTOM_DOMAIN")
@@ -236,21 +239,88 @@ CELERY_TASK_CREATE_MISSING_QUEUES = False
 CELERY_TASK_ACKS_LATE = True
 CELERY_TASK_WAIT_TIME_HOURS = 24
 
-# True - declare DLX for the main queue, False - leave as is
-CELERY_TASK_DEFAULT_QUEUE_DECLARE_DLX = True
+# True - declare DLX for the main queue, False - leave as is.
+# Dead lettering relies on queue arguments only AMQP brokers (RabbitMQ)
+# support, so it is only declared for those; on Redis, emails that exhaust
+# their retries are kept in the failed store instead, see utils.tasks.emails
+CELERY_TASK_DEFAULT_QUEUE_DECLARE_DLX = os.getenv(
+    "CELERY_BROKER_URL", ""
+).startswith(("amqp://", "amqps://", "pyamqp://"))
 
 CELERY_BROKER_DLX_EXCHANGE = "DLX"
 CELERY_BROKER_DLX_PREFIX = "dlx"
 CELERY_BROKER_DURABLE = True
 CELERY_BROKER_AUTO_DELETE = False
 
-CELERY_TASK_ROUTES = {}
+# Queues, each consumed by its own workers (see docker-compose.yml) so a
+# backlog on one never delays the others:
+# - default: short housekeeping tasks
+# - rendering: building email bodies and documents
+# - emails: transactional emails, see utils.tasks.emails
+# - bulk: mass sends and periodic batch jobs
+CELERY_RENDERING_QUEUE = "rendering"
+CELERY_EMAIL_QUEUE = "emails"
+CELERY_BULK_QUEUE = "bulk"
+
+
+def _declare_queue(name):
+    """Queue whose rejected messages are routed to `<DLX prefix>.<name>`"""
+    arguments = None
+    if CELERY_TASK_DEFAULT_QUEUE_DECLARE_DLX:
+        arguments = {
+            "x-dead-letter-exchange": CELERY_BROKER_DLX_EXCHANGE,
+            "x-dead-letter-routing-key": f"{CELERY_BROKER_DLX_PREFIX}.{name}",
+        }
+    return Queue(
+        name,
+        Exchange(name),
+        routing_key=name,
+        durable=CELERY_BROKER_DURABLE,
+        auto_delete=CELERY_BROKER_AUTO_DELETE,
+        queue_arguments=arguments,
+    )
+
+
+CELERY_TASK_QUEUES = [
+    _declare_queue(name)
+    for name in (
+        CELERY_TASK_DEFAULT_QUEUE,
+        CELERY_RENDERING_QUEUE,
+        CELERY_EMAIL_QUEUE,
+        CELERY_BULK_QUEUE,
+    )
+]
+CELERY_IMPORTS = ["utils.tasks.emails"]
+# Tasks not listed here run on the default queue
+CELERY_TASK_ROUTES = {
+    "accounts.tasks.flush_last_logins": {"queue": CELERY_TASK_DEFAULT_QUEUE},
+    "accounts.tasks.send_welcome_email": {"queue": CELERY_RENDERING_QUEUE},
+    "Send Emails": {"queue": CELERY_EMAIL_QUEUE},
+    "Drain Emails": {"queue": CELERY_EMAIL_QUEUE},
+    "Send SES Email": {"queue": CELERY_EMAIL_QUEUE},
+    "Send Mailpit Email": {"queue": CELERY_EMAIL_QUEUE},
+    "Send SES Bulk Email": {"queue": CELERY_BULK_QUEUE},
+}
+# With late acks, reserve one task per process at a time, so long tasks do
+# not hold back tasks another process could run
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
 CELERY_BEAT_SCHEDULE = {
     "Send periodic notifications": {
         "task": "notifications.tasks.send_periodic_notifications",
         "schedule": crontab(minute=0, hour=0, day_of_week="*"),  # every day at midnight
         "options": {"expires": 1800},
     },
+    "Flush last logins": {
+        "task": "accounts.tasks.flush_last_logins",
+        "schedule": crontab(minute="*"),  # every minute
+        "options": {"expires": 50},
+    },
+    # Emails schedule their own drain, this only catches a lost one
+    "Drain emails": {
+        "task": "Drain Emails",
+        "schedule": crontab(minute="*"),  # every minute
+        "options": {"expires": 50},
+    },
 }
 CELERY_RESULT_BACKEND = "django-db"
 
@@ -263,10 +333,26 @@ REST_FRAMEWORK = {
     "DEFAULT_VERSION": "v1",
     "DEFAULT_RENDERER_CLASSES": [
         "utils.renderer.ResponseRenderer",
+        "utils.renderer.MessagePackRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "rest_framework.parsers.JSONParser",
+        "utils.parsers.MessagePackParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
     ],
     "DEFAULT_THROTTLE_RATES": {
-        "password_reset": "1/3m",
-        "resend_email_token": "1/3m",
+        # Per email, and per user or IP so one caller cannot cycle emails
+        "password_reset": "3/1h",
+        "password_reset_ip": "3/1h",
+        "resend_email_token": "5/1h",
+        "resend_email_token_ip": "5/1h",
+        # Per driver, see eld.throttles.DriverThrottle
+        "eld_read": "300/1m",
+        "eld_write": "60/1m",
+        "eld_planning": "10/1m",
+        # Messages per second across every worker, see SendRateLimiter
+        "ses_send": os.getenv("AWS_SES_SEND_RATE", "14/1s"),
     },
 }
 
@@ -288,15 +374,20 @@ SPECTACULAR_SETTINGS = {
     "SORT_OPERATIONS": False,
 }
 
+# Map provider
+OPENROUTESERVICE_API_KEY = os.environ.get("OPENROUTESERVICE_API_KEY")
+
 REDIS_HOST = os.getenv("REDIS_HOST")
 REDIS_PORT = os.getenv("REDIS_PORT")
 
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=5),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
+    # Rotation, revocation and last_login are handled by the refresh token
+    # store in accounts.tokens
     "ROTATE_REFRESH_TOKENS": True,
-    "BLACKLIST_AFTER_ROTATION": True,
-    "UPDATE_LAST_LOGIN": True,
+    "BLACKLIST_AFTER_ROTATION": False,
+    "UPDATE_LAST_LOGIN": False,
     "ALGORITHM": "HS256",
     "SIGNING_KEY": SECRET_KEY,
     "VERIFYING_KEY": "",
@@ -317,8 +408,8 @@ SIMPLE_JWT = {
     "SLIDING_TOKEN_REFRESH_EXP_CLAIM": "refresh_exp",
     "SLIDING_TOKEN_LIFETIME": timedelta(minutes=5),
     "SLIDING_TOKEN_REFRESH_LIFETIME": timedelta(days=1),
-    "TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainPairSerializer",
-    "TOKEN_REFRESH_SERIALIZER": "rest_framework_simplejwt.serializers.TokenRefreshSerializer",
+    "TOKEN_OBTAIN_SERIALIZER": "accounts.serializers.accounts.StoredTokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "accounts.serializers.accounts.StoredTokenRefreshSerializer",
     "TOKEN_VERIFY_SERIALIZER": "rest_framework_simplejwt.serializers.TokenVerifySerializer",
     "TOKEN_BLACKLIST_SERIALIZER": "rest_framework_simplejwt.serializers.TokenBlacklistSerializer",
     "SLIDING_TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainSlidingSerializer",
@@ -336,8 +427,8 @@ REDIS_CONNECTION_INSTANCE = None
 if os.getenv("REDIS_URL") and not os.getenv("DJANGO_SETTINGS_MODULE", "").endswith(
     "test"
 ):
-    REDIS_CONNECTION_INSTANCE = redis.Redis(
-        host=os.getenv("REDIS_URL"), port=6379, db=0, decode_responses=True
+    REDIS_CONNECTION_INSTANCE = redis.Redis.from_url(
+        os.getenv("REDIS_URL"), decode_responses=True
     )
 
 
@@ -417,4 +508,9 @@ EMAIL_HOST_USER = "resend"
 EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD")
 EMAIL_USE_TLS = True
 EMAIL_USE_SSL = os.getenv("EMAIL_USE_SSL", "False").lower() == "true"
-DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL", "noreply@yourdomain.com")
\ No newline at end of file
+DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL", "noreply@yourdomain.com")
+# Emails sent per task, over a single connection
+EMAIL_BATCH_SIZE = 50
+EMAIL_MAX_RETRIES = 5
+# Seconds emails are buffered before being sent together in batches
+EMAIL_DRAIN_DELAY = 2
\ No newline at end of file
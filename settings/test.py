@@ -16,6 +16,8 @@ AWS_ACCESS_KEY_ID = ""
 AWS_SECRET_ACCESS_KEY = ""
 AWS_STORAGE_BUCKET_NAME = ""
 
+OPENROUTESERVICE_API_KEY = None
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
@@ -29,4 +31,6 @@ CELERY_BROKER_URL = "memory://"
 # Disable password hashing for faster tests
 PASSWORD_HASHERS = [
     "django.contrib.auth.hashers.MD5PasswordHasher",
-]
\ No newline at end of file
+]
+# Run Celery tasks in process
+CELERY_TASK_ALWAYS_EAGER = True
@@ -2,24 +2,90 @@
 AWS client utilities for the Django Project Template.
 """
 
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
 import boto3
+from botocore.config import Config
 from django.conf import settings
 
+_lock = threading.Lock()
+_session: Optional[boto3.session.Session] = None
+_clients: Dict[Tuple[str, str], object] = {}
+_resources = threading.local()
+
+
+def _reset():
+    """
+    Drop the clients in a forked worker, whose sockets are the parent's.
+    The lock is replaced too: another thread may have held it at the fork.
+    """
+    global _lock, _session
+    _lock = threading.Lock()
+    _session = None
+    _clients.clear()
+    _resources.__dict__.clear()
+
+
+os.register_at_fork(after_in_child=_reset)
+
 
 class AWSClient:
-    """AWS client for interacting with AWS services."""
+    """
+    AWS client for interacting with AWS services.
+
+    Clients are created once per process, service and region and shared by
+    every instance, so credentials and endpoints are resolved once and
+    connections are reused across tasks and requests. Clients are
+    thread-safe; resources are not, so those are kept per thread.
+    """
 
-    def __init__(self, service_name: str):
+    def __init__(self, service_name: str, region_name: Optional[str] = None):
         self.service_name = service_name
-        self.client = None
+        self.region_name = region_name or settings.AWS_REGION
 
     def get_client(self):
         """Get AWS client instance."""
-        if not self.client:
-            self.client = boto3.client(
-                self.service_name,
+        key = (self.service_name, self.region_name)
+        client = _clients.get(key)
+        if client is None:
+            with _lock:
+                client = _clients.get(key)
+                if client is None:
+                    client = _clients[key] = self._get_session().client(
+                        self.service_name,
+                        region_name=self.region_name,
+                        config=self._get_config(),
+                    )
+        return client
+
+    def get_resource(self):
+        """Get AWS resource instance, for the current thread."""
+        key = f"{self.service_name}:{self.region_name}"
+        resource = getattr(_resources, key, None)
+        if resource is None:
+            with _lock:
+                resource = self._get_session().resource(
+                    self.service_name,
+                    region_name=self.region_name,
+                    config=self._get_config(),
+                )
+            setattr(_resources, key, resource)
+        return resource
+
+    def _get_config(self):
+        return Config(
+            max_pool_connections=settings.AWS_MAX_POOL_CONNECTIONS,
+            retries={"max_attempts": 3, "mode": "adaptive"},
+        )
+
+    def _get_session(self):
+        """Process session, created lazily; callers hold `_lock`."""
+        global _session
+        if _session is None:
+            _session = boto3.session.Session(
                 aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
                 aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-                region_name=settings.AWS_REGION,
             )
-        return self.client
\ No newline at end of file
+        return _session
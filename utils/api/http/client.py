@@ -0,0 +1,281 @@
+"""
+Pooled HTTP client utilities for external API providers.
+"""
+
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.exceptions import ExternalRequestException
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """
+    Stop calling a provider after repeated failures.
+
+    After `failure_threshold` consecutive failures the circuit opens and
+    calls fail fast for `reset_timeout` seconds. A single trial call is
+    then let through: success closes the circuit, failure reopens it.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_progress = False
+        self.lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow_request(self) -> bool:
+        """Check if a call may go through"""
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.trial_in_progress:
+                return False
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.trial_in_progress = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_progress = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial_in_progress or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.trial_in_progress = False
+
+    def release_trial(self):
+        """Let another trial through after one that never reached the provider"""
+        with self.lock:
+            self.trial_in_progress = False
+
+
+class LatencyMetrics:
+    """Per-call latency and outcome counters for a provider"""
+
+    def __init__(self, window: int = 1000):
+        self.latencies = deque(maxlen=window)
+        self.calls = 0
+        self.failures = 0
+        self.rejections = 0
+        self.lock = threading.Lock()
+
+    def record(self, latency: float, success: bool):
+        with self.lock:
+            self.calls += 1
+            self.latencies.append(latency)
+            if not success:
+                self.failures += 1
+
+    def record_rejection(self):
+        with self.lock:
+            self.rejections += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters and latency percentiles (seconds) over the window"""
+        with self.lock:
+            latencies = sorted(self.latencies)
+            calls, failures = self.calls, self.failures
+            rejections = self.rejections
+
+        def percentile(value):
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(len(latencies) * value))]
+
+        return {
+            "calls": calls,
+            "failures": failures,
+            "rejections": rejections,
+            "p50": percentile(0.5),
+            "p95": percentile(0.95),
+            "max": latencies[-1] if latencies else None,
+        }
+
+
+class HTTPClient:
+    """
+    Shared HTTP client for an external provider.
+
+    Keeps a pooled keep-alive session, bounds the number of concurrent
+    calls, retries transient failures of idempotent requests with jittered
+    exponential backoff,
+    fails fast while the provider's circuit is open and records the
+    latency of every call. Use `HTTPClient.for_provider` to get the
+    process-wide instance for a provider.
+    """
+
+    RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+    IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+    _instances: Dict[str, "HTTPClient"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(
+        self,
+        name: str,
+        base_url: str = "",
+        pool_maxsize: int = 20,
+        max_concurrency: int = 10,
+        acquire_timeout: float = 2,
+        timeout: tuple = (3.05, 10),
+        max_retries: int = 2,
+        backoff: float = 0.2,
+        max_backoff: float = 2,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30,
+    ):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.acquire_timeout = acquire_timeout
+        self.semaphore = threading.BoundedSemaphore(max_concurrency)
+        self.circuit = CircuitBreaker(failure_threshold, reset_timeout)
+        self.metrics = LatencyMetrics()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_maxsize, max_retries=0
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    @classmethod
+    def for_provider(cls, name: str, **kwargs) -> "HTTPClient":
+        """Get the shared client for a provider, creating it on first use"""
+        client = cls._instances.get(name)
+        if client is None:
+            with cls._instances_lock:
+                client = cls._instances.get(name)
+                if client is None:
+                    client = cls._instances[name] = cls(name, **kwargs)
+        return client
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        return self.request("POST", path, **kwargs)
+
+    def request(
+        self, method: str, path: str, retry: Optional[bool] = None, **kwargs
+    ) -> requests.Response:
+        """
+        Send a request to the provider.
+
+        Only idempotent methods are retried unless `retry` says otherwise,
+        e.g. `retry=True` for a POST that only reads.
+
+        Raises ExternalRequestException when the circuit is open, when no
+        call slot frees up within `acquire_timeout` or when the call still
+        fails after all retries.
+        """
+        if retry is None:
+            retry = method.upper() in self.IDEMPOTENT_METHODS
+
+        if not self.circuit.allow_request():
+            self.metrics.record_rejection()
+            raise ExternalRequestException(f"{self.name} is unavailable")
+
+        # Never queue web workers behind a slow provider for long
+        try:
+            acquired = self.semaphore.acquire(timeout=self.acquire_timeout)
+        except BaseException:
+            self.circuit.release_trial()
+            raise
+        if not acquired:
+            self.circuit.release_trial()
+            self.metrics.record_rejection()
+            raise ExternalRequestException(f"{self.name} is overloaded")
+
+        try:
+            return self._send_with_retries(
+                method, path, self.max_retries if retry else 0, **kwargs
+            )
+        except ExternalRequestException:
+            # The outcome is already recorded on the circuit
+            raise
+        except requests.RequestException as e:
+            # e.g. TooManyRedirects, which are not retried
+            self.circuit.record_failure()
+            logger.warning(f"{self.name} request failed: {e}")
+            raise ExternalRequestException(f"{self.name} request failed") from e
+        except BaseException:
+            self.circuit.release_trial()
+            raise
+        finally:
+            self.semaphore.release()
+
+    def _send_with_retries(self, method, path, max_retries, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        url = f"{self.base_url}/{path.lstrip('/')}" if self.base_url else path
+
+        for attempt in range(max_retries + 1):
+            response, error = self._send(method, url, **kwargs)
+            if error is None and response.status_code not in self.RETRY_STATUS_CODES:
+                self.circuit.record_success()
+                if not response.ok:
+                    raise ExternalRequestException(
+                        f"{self.name} rejected the request "
+                        f"({response.status_code})"
+                    )
+                return response
+
+            if attempt < max_retries:
+                time.sleep(self._get_backoff(attempt, response))
+
+        self.circuit.record_failure()
+        logger.warning(
+            f"{self.name} request failed after {max_retries + 1} "
+            f"attempts: {error or response.status_code}"
+        )
+        raise ExternalRequestException(f"{self.name} request failed")
+
+    def _send(self, method, url, **kwargs):
+        """Send a single request, returning (response, error)"""
+        started = time.perf_counter()
+        response, error = None, None
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = e
+        latency = time.perf_counter() - started
+
+        success = error is None and response.status_code < 500
+        self.metrics.record(latency, success)
+        logger.debug(
+            f"{self.name} {method} {url} -> "
+            f"{getattr(response, 'status_code', error)} in {latency * 1000:.0f}ms"
+        )
+        return response, error
+
+    def _get_backoff(
+        self, attempt: int, response: Optional[requests.Response]
+    ) -> float:
+        """Full-jitter exponential backoff, honouring Retry-After"""
+        retry_after = response is not None and response.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.max_backoff)
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
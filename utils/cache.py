@@ -0,0 +1,77 @@
+"""
+Caching of rendered API responses.
+"""
+
+import hashlib
+import uuid
+from typing import Any, Callable, Dict, Optional
+
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+from utils.renderer import RenderedContent
+
+
+class ResponseCache:
+    """
+    Cache rendered response bodies per owner (e.g. a driver).
+
+    Every key embeds the owner's current version token, so `invalidate`
+    drops all of an owner's entries at once by replacing the token; stale
+    entries are never read again and expire on their own. Cached bodies
+    are returned as `RenderedContent`, which the renderer sends as is.
+    """
+
+    def __init__(self, name: str, timeout: int = 60 * 60):
+        self.name = name
+        self.timeout = timeout
+
+    def get_or_build(
+        self,
+        request,
+        owner_id: Any,
+        endpoint: str,
+        build: Callable[[], Response],
+        params: Optional[Dict[str, Any]] = None,
+    ) -> Response:
+        """
+        Return the cached response for `endpoint`, or the one from `build()`
+        whose rendered body is cached when it succeeds
+        """
+        key = self._key(request, owner_id, endpoint, params)
+        content = cache.get(key)
+        if content is not None:
+            return Response(RenderedContent(content), status=status.HTTP_200_OK)
+
+        response = build()
+        if response.status_code == status.HTTP_200_OK:
+
+            def store(rendered):
+                cache.set(key, rendered.content, timeout=self.timeout)
+
+            response.add_post_render_callback(store)
+        return response
+
+    def get_version(self, owner_id: Any) -> str:
+        """Token that changes whenever the owner's entries are invalidated"""
+        return cache.get_or_set(
+            self._version_key(owner_id), uuid.uuid4().hex, timeout=None
+        )
+
+    def invalidate(self, owner_id: Any) -> None:
+        """Drop every cached response of the owner"""
+        cache.set(self._version_key(owner_id), uuid.uuid4().hex, timeout=None)
+
+    def _key(self, request, owner_id, endpoint, params):
+        # Read the version before building, so a write racing the build
+        # stores its body under a version that is already outdated
+        version = self.get_version(owner_id)
+        variant = repr(
+            (request.accepted_media_type, sorted((params or {}).items()))
+        )
+        digest = hashlib.sha1(variant.encode()).hexdigest()
+        return f"response:{self.name}:{owner_id}:{version}:{endpoint}:{digest}"
+
+    def _version_key(self, owner_id):
+        return f"response:{self.name}:{owner_id}:version"
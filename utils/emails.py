@@ -1,7 +1,43 @@
+import re
 from abc import ABC, abstractmethod
-from django.core.mail import EmailMessage
-from django.template.loader import render_to_string
+from functools import lru_cache
+from typing import Iterable, List
+import pynliner
 from django.conf import settings
+from django.template import engines
+from django.template.loader import get_template
+from utils.tasks.emails import build_email_message, queue_email, queue_emails
+from utils.types import QueuedEmail
+
+EMAIL_TEMPLATES_DIR = "emails"
+STYLE_BLOCK = re.compile(r"<style[^>]*>.*?</style>", re.S | re.I)
+
+
+@lru_cache(maxsize=None)
+def get_email_template(template_name: str):
+    """
+    Email template with its CSS inlined, compiled once per process so a
+    send only fills in the context.
+
+    The style blocks are kept as well, for rules on classes that are only
+    known at send time (e.g. `class="box {{ type }}"`) and media queries.
+    """
+    source = get_template(template_name).template.source
+    styles = "".join(STYLE_BLOCK.findall(source))
+    inlined = pynliner.fromString(source).replace("</head>", f"{styles}</head>", 1)
+    return engines["django"].from_string(inlined)
+
+
+def compile_email_templates() -> List[str]:
+    """Compile every template under `templates/emails/`, returning their names"""
+    root = settings.BASE_DIR / "templates"
+    names = sorted(
+        path.relative_to(root).as_posix()
+        for path in (root / EMAIL_TEMPLATES_DIR).rglob("*.html")
+    )
+    for name in names:
+        get_email_template(name)
+    return names
 
 
 class BaseEmail(ABC):
@@ -37,19 +73,30 @@ class BaseEmail(ABC):
 
     def render_template(self):
         """Render the email template with context data."""
-        return render_to_string(self.template_name, self.context)
-
-    def send_email(self):
-        """Send the email with optional attachment."""
-        email_content = self.render_template()
-        email = EmailMessage(
-            subject=self.subject,
-            body=email_content,
-            to=self.to_email,
-        )
-        email.content_subtype = "html"
-
-        if self.attachment:
-            email.attach_file(self.attachment)
-
-        email.send()
+        return get_email_template(self.template_name).render(self.context)
+
+    def get_queued_email(self) -> QueuedEmail:
+        """Rendered email, ready to be queued."""
+        return {
+            "subject": self.subject,
+            "from_email": settings.DEFAULT_FROM_EMAIL,
+            "to": self.to_email,
+            "body": self.render_template(),
+            "attachment": self.attachment,
+        }
+
+    def send_email(self, queued: bool = True):
+        """
+        Send the email with optional attachment. It is buffered and sent
+        in a batch with other emails unless `queued` is False, which sends
+        it right away.
+        """
+        if queued:
+            queue_email(self.get_queued_email())
+        else:
+            build_email_message(self.get_queued_email()).send()
+
+    @staticmethod
+    def send_emails(emails: Iterable["BaseEmail"]):
+        """Enqueue several emails, sent in batches over one connection each."""
+        queue_emails([email.get_queued_email() for email in emails])
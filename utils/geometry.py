@@ -0,0 +1,138 @@
+"""
+Route geometry helpers, shared by the core models and the ELD app.
+
+Geometry is stored as Google encoded polylines: each coordinate is the
+delta from the previous one, scaled to `precision` decimal places and
+packed into base64-like characters, which takes a few bytes per point
+instead of the ~40 bytes of a JSON float pair.
+"""
+
+from typing import List, Sequence, Tuple
+
+Coordinate = Tuple[float, float]  # (latitude, longitude)
+
+
+def encode_polyline(coordinates: Sequence[Sequence[float]], precision: int = 5) -> str:
+    """Encode (latitude, longitude) pairs into a polyline string"""
+    factor = 10**precision
+    chunks = []
+    previous_lat = previous_lng = 0
+
+    for latitude, longitude in coordinates:
+        lat = round(latitude * factor)
+        lng = round(longitude * factor)
+        chunks.append(_encode_value(lat - previous_lat))
+        chunks.append(_encode_value(lng - previous_lng))
+        previous_lat, previous_lng = lat, lng
+
+    return "".join(chunks)
+
+
+def decode_polyline(polyline: str, precision: int = 5) -> List[Coordinate]:
+    """Decode a polyline string into (latitude, longitude) pairs"""
+    factor = 10**precision
+    coordinates = []
+    index = lat = lng = 0
+
+    while index < len(polyline):
+        delta, index = _decode_value(polyline, index)
+        lat += delta
+        delta, index = _decode_value(polyline, index)
+        lng += delta
+        coordinates.append((lat / factor, lng / factor))
+
+    return coordinates
+
+
+def join_polylines(polylines: Sequence[str], precision: int = 5) -> str:
+    """Join consecutive polylines, dropping repeated junction points"""
+    coordinates = []
+    for polyline in polylines:
+        points = decode_polyline(polyline, precision)
+        if coordinates and points and coordinates[-1] == points[0]:
+            points = points[1:]
+        coordinates.extend(points)
+    return encode_polyline(coordinates, precision)
+
+
+def _encode_value(value: int) -> str:
+    value = ~(value << 1) if value < 0 else value << 1
+    chunks = []
+    while value >= 0x20:
+        chunks.append(chr((0x20 | (value & 0x1F)) + 63))
+        value >>= 5
+    chunks.append(chr(value + 63))
+    return "".join(chunks)
+
+
+def _decode_value(polyline: str, index: int) -> Tuple[int, int]:
+    result = shift = 0
+    while True:
+        byte = ord(polyline[index]) - 63
+        index += 1
+        result |= (byte & 0x1F) << shift
+        shift += 5
+        if byte < 0x20:
+            break
+    value = ~(result >> 1) if result & 1 else result >> 1
+    return value, index
+
+
+# Zoom levels (web map tiles) that simplified geometry is precomputed for
+ZOOM_LEVELS = (4, 6, 8, 10, 12, 14, 16)
+
+
+def zoom_to_tolerance(zoom: int) -> float:
+    """Degrees covered by one 256px-tile pixel at the given zoom level"""
+    return 360 / (256 * 2**zoom)
+
+
+def simplify_polyline(
+    coordinates: Sequence[Coordinate], tolerance: float
+) -> List[Coordinate]:
+    """
+    Simplify a line with the Douglas-Peucker algorithm, dropping points
+    closer than `tolerance` degrees to the simplified line.
+    """
+    if len(coordinates) < 3 or tolerance <= 0:
+        return list(coordinates)
+
+    keep = [False] * len(coordinates)
+    keep[0] = keep[-1] = True
+    segments = [(0, len(coordinates) - 1)]
+    while segments:
+        start, end = segments.pop()
+        farthest, index = 0.0, None
+        for i in range(start + 1, end):
+            distance = _segment_distance(
+                coordinates[i], coordinates[start], coordinates[end]
+            )
+            if distance > farthest:
+                farthest, index = distance, i
+        if index is not None and farthest > tolerance:
+            keep[index] = True
+            segments.extend([(start, index), (index, end)])
+
+    return [point for point, kept in zip(coordinates, keep) if kept]
+
+
+def build_levels_of_detail(coordinates: Sequence[Coordinate]) -> dict:
+    """
+    Encoded simplified geometry for every zoom level in `ZOOM_LEVELS`.
+    Each coarser level is simplified from the finer one before it.
+    """
+    levels = {}
+    for zoom in sorted(ZOOM_LEVELS, reverse=True):
+        coordinates = simplify_polyline(coordinates, zoom_to_tolerance(zoom))
+        levels[zoom] = encode_polyline(coordinates)
+    return levels
+
+
+def _segment_distance(point, start, end) -> float:
+    """Planar distance from `point` to the segment `start`-`end`"""
+    (y, x), (y1, x1), (y2, x2) = point, start, end
+    dx, dy = x2 - x1, y2 - y1
+    if dx == dy == 0:
+        return ((x - x1) ** 2 + (y - y1) ** 2) ** 0.5
+    t = max(0, min(1, ((x - x1) * dx + (y - y1) * dy) / (dx * dx + dy * dy)))
+    return ((x - x1 - t * dx) ** 2 + (y - y1 - t * dy) ** 2) ** 0.5
@@ -0,0 +1,22 @@
+from typing import Any, Dict, Optional
+
+import msgpack
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+class MessagePackParser(BaseParser):
+    """Parse MessagePack request bodies"""
+
+    media_type = "application/msgpack"
+
+    def parse(
+        self,
+        stream,
+        media_type: Optional[str] = None,
+        parser_context: Optional[Dict[str, Any]] = None,
+    ) -> Any:
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, msgpack.UnpackException) as e:
+            raise ParseError(f"MessagePack parse error - {e}") from e
@@ -1,18 +1,22 @@
+import json
 from typing import Any, Dict, Optional
 
+import msgpack
+import orjson
 from rest_framework import renderers
+from rest_framework.utils import encoders
 
 
-class ResponseRenderer(renderers.JSONRenderer):
-    def render(
-        self,
-        data: Dict[str, Any] | str,
-        accepted_media_type: Optional[str] = None,
-        renderer_context: Optional[Dict[str, Any]] = None,
-    ) -> bytes:
-        """
-        Render `data` into JSON, returning a bytestring.
-        """
+class RenderedContent(bytes):
+    """A response body that was already rendered, e.g. read from a cache"""
+
+
+class EnvelopeRendererMixin:
+    """Wrap response data in the {error, message, data} envelope"""
+
+    def get_envelope(
+        self, data: Any, renderer_context: Optional[Dict[str, Any]]
+    ) -> Dict[str, Any]:
         response = renderer_context["response"]
         context = {}
         context.setdefault("error", None)
@@ -27,4 +31,76 @@ class ResponseRenderer(renderers.JSONRenderer):
             )
         else:
             context["data"] = data
-        return super().render(context, accepted_media_type, renderer_context) 
\ No newline at end of file
+        return context
+
+
+class ResponseRenderer(EnvelopeRendererMixin, renderers.JSONRenderer):
+    # orjson encodes UUID, date, time and datetime values natively; anything
+    # else (Decimal, lazy strings, querysets...) goes through DRF's encoder
+    options = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+    fallback_encoder = encoders.JSONEncoder()
+
+    def render(
+        self,
+        data: Dict[str, Any] | str,
+        accepted_media_type: Optional[str] = None,
+        renderer_context: Optional[Dict[str, Any]] = None,
+    ) -> bytes:
+        """
+        Render `data` into JSON, returning a bytestring.
+        """
+        if isinstance(data, RenderedContent):
+            return bytes(data)
+
+        context = self.get_envelope(data, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context):
+            # Pretty printing was requested, keep DRF's formatting
+            return super().render(context, accepted_media_type, renderer_context)
+        return self.encode(context)
+
+    def encode(self, value: Any) -> bytes:
+        """Compact JSON for `value`, without the envelope"""
+        try:
+            return orjson.dumps(
+                value, default=self.fallback_encoder.default, option=self.options
+            )
+        except orjson.JSONEncodeError:
+            # e.g. integers wider than 64 bits, which orjson cannot encode
+            return json.dumps(
+                value,
+                cls=encoders.JSONEncoder,
+                ensure_ascii=self.ensure_ascii,
+                allow_nan=not self.strict,
+                separators=(",", ":"),
+            ).encode()
+
+
+class MessagePackRenderer(EnvelopeRendererMixin, renderers.BaseRenderer):
+    """
+    Render the response envelope as MessagePack. Values without a
+    MessagePack type (UUID, dates, Decimal...) are encoded as in JSON.
+    """
+
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+    fallback_encoder = encoders.JSONEncoder()
+
+    def render(
+        self,
+        data: Dict[str, Any] | str,
+        accepted_media_type: Optional[str] = None,
+        renderer_context: Optional[Dict[str, Any]] = None,
+    ) -> bytes:
+        """
+        Render `data` into MessagePack, returning a bytestring.
+        """
+        if isinstance(data, RenderedContent):
+            return bytes(data)
+
+        return msgpack.packb(
+            self.get_envelope(data, renderer_context),
+            default=self.fallback_encoder.default,
+            use_bin_type=True,
+        )
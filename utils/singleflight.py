@@ -0,0 +1,148 @@
+"""
+Request coalescing for expensive, idempotent calls.
+"""
+
+import json
+import logging
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict
+
+import redis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Delete the lock only if it is still held by the caller
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class _Call:
+    """An in-flight call shared by every caller with the same key"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Share one execution of a call between concurrent identical callers.
+
+    Within a process, callers arriving while a call for the same key is
+    running wait for it and get its result (or exception). When
+    `REDIS_CONNECTION_INSTANCE` is configured the leader also takes a
+    Redis lock and publishes its JSON result for a few seconds, so leaders
+    in other processes reuse it instead of repeating the call. Redis
+    errors fall back to running the call locally.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        lock_timeout: float = 30,
+        result_ttl: float = 5,
+        wait_timeout: float = 30,
+        poll_interval: float = 0.05,
+    ):
+        self.name = name
+        self.lock_timeout = lock_timeout
+        self.result_ttl = result_ttl
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self.calls: Dict[str, _Call] = {}
+        self.lock = threading.Lock()
+
+    def do(self, key: str, func: Callable[[], Any]) -> Any:
+        """Run `func` once for all concurrent callers with the same key"""
+        with self.lock:
+            call = self.calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self.calls[key] = _Call()
+
+        if not is_leader:
+            if not call.event.wait(self.wait_timeout):
+                return func()
+            if call.error:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._do_shared(key, func)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.event.set()
+        return call.result
+
+    def _do_shared(self, key: str, func: Callable[[], Any]) -> Any:
+        """Coalesce the call with other processes through Redis"""
+        connection = settings.REDIS_CONNECTION_INSTANCE
+        if connection is None:
+            return func()
+
+        lock_key = f"singleflight:{self.name}:{key}:lock"
+        result_key = f"singleflight:{self.name}:{key}:result"
+        token = uuid.uuid4().hex
+        try:
+            if cached := connection.get(result_key):
+                return json.loads(cached)
+            is_leader = connection.set(
+                lock_key, token, nx=True, px=int(self.lock_timeout * 1000)
+            )
+        except redis.RedisError as e:
+            logger.warning(f"Singleflight {self.name} skipped Redis: {e}")
+            return func()
+
+        if is_leader:
+            try:
+                result = func()
+                self._publish(connection, result_key, result)
+                return result
+            finally:
+                self._release(connection, lock_key, token)
+
+        return self._wait_for_leader(connection, lock_key, result_key, func)
+
+    def _wait_for_leader(self, connection, lock_key, result_key, func):
+        """Poll for the leader's result, running `func` if it never comes"""
+        deadline = time.monotonic() + self.wait_timeout
+        try:
+            while time.monotonic() < deadline:
+                if cached := connection.get(result_key):
+                    return json.loads(cached)
+                if not connection.exists(lock_key):
+                    # Leader failed without publishing a result
+                    break
+                time.sleep(self.poll_interval)
+        except redis.RedisError as e:
+            logger.warning(f"Singleflight {self.name} skipped Redis: {e}")
+        return func()
+
+    def _publish(self, connection, result_key, result):
+        """Share the result; failing to does not fail the call"""
+        try:
+            connection.set(
+                result_key,
+                json.dumps(result),
+                px=int(self.result_ttl * 1000),
+            )
+        except redis.RedisError as e:
+            logger.warning(f"Singleflight {self.name} result not shared: {e}")
+
+    def _release(self, connection, lock_key, token):
+        try:
+            connection.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+        except redis.RedisError as e:
+            logger.warning(f"Singleflight {self.name} lock not released: {e}")
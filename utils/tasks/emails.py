@@ -2,16 +2,193 @@
 Email tasks for Celery background processing.
 """
 
+import json
 import logging
+import uuid
+from smtplib import SMTPRecipientsRefused, SMTPResponseException
+from typing import Any, Dict, List, Optional
 
-from django.core.mail import EmailMessage
-from core.celery import app
-from utils.types import MailPitEmail, SESEmail
+import redis
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from config.celery import app
+from utils.throttles import SendRateLimiter
+from utils.types import BulkRecipient, MailPitEmail, QueuedEmail, SESEmail
 
 from ..api.aws.client import AWSClient
 
 logger = logging.getLogger(__name__)
 
+# Most destinations SES accepts in one SendBulkTemplatedEmail call
+SES_BULK_DESTINATIONS = 50
+# Destination statuses that may succeed when sent again
+SES_RETRYABLE_STATUSES = {"TransientFailure", "AccountThrottled"}
+# Error codes of whole calls that may succeed when sent again
+SES_RETRYABLE_ERRORS = {"Throttling", "ServiceUnavailable", "InternalFailure"}
+# Redis list of emails that could not be sent, on a broker without DLX
+FAILED_EMAILS_KEY = "emails:failed"
+# Redis list of emails waiting for the next drain, and its schedule flag
+PENDING_EMAILS_KEY = "emails:pending"
+DRAIN_SCHEDULED_KEY = "emails:drain-scheduled"
+
+
+def build_email_message(email: QueuedEmail, connection=None) -> EmailMessage:
+    """HTML `EmailMessage` for a queued email"""
+    message = EmailMessage(
+        subject=email["subject"],
+        body=email["body"],
+        from_email=email.get("from_email"),
+        to=email["to"],
+        connection=connection,
+    )
+    message.content_subtype = "html"
+    if attachment := email.get("attachment"):
+        message.attach_file(attachment)
+    return message
+
+
+@app.task(bind=True, name="Send Emails", max_retries=settings.EMAIL_MAX_RETRIES)
+def send_emails(self, emails: List[QueuedEmail]) -> int:
+    """
+    Send a batch of emails over a single connection of the email backend
+    (SMTP or SES). Each email succeeds or fails on its own: emails the
+    server refuses outright are set aside at once, the others are retried
+    with backoff and set aside once retries are exhausted.
+    """
+    connection = get_connection()
+    sent, unsent, refused = 0, [], []
+    error = None
+    try:
+        connection.open()
+        for email in emails:
+            try:
+                build_email_message(email, connection).send()
+                sent += 1
+            except Exception as e:
+                (refused if is_permanent_failure(e) else unsent).append(email)
+                error = e
+    except Exception as e:
+        # The connection could not be opened, nothing was sent
+        unsent, error = emails, e
+    finally:
+        connection.close()
+
+    if refused:
+        set_aside_emails(refused, error)
+    if unsent:
+        if self.request.retries >= self.max_retries:
+            set_aside_emails(unsent, error)
+        else:
+            logger.warning(f"{len(unsent)} emails not sent, retrying: {error}")
+            countdown = 60 * 2**self.request.retries
+            raise self.retry(args=(unsent,), exc=error, countdown=countdown)
+
+    logger.debug(f"Sent {sent} emails")
+    return sent
+
+
+def is_permanent_failure(exc: Exception) -> bool:
+    """Whether the server refused the email for good, e.g. a bad recipient"""
+    if isinstance(exc, SMTPRecipientsRefused):
+        return True
+    return isinstance(exc, SMTPResponseException) and exc.smtp_code >= 500
+
+
+def set_aside_emails(emails: List[QueuedEmail], exc: Exception):
+    """
+    Keep emails that cannot be sent: in the email queue's dead letter queue
+    on AMQP brokers, otherwise in the failed store.
+    """
+    if not settings.CELERY_TASK_DEFAULT_QUEUE_DECLARE_DLX:
+        store_failed_emails(emails, exc)
+        return
+
+    logger.error(f"{len(emails)} emails not sent, dead-lettering: {exc}")
+    app.send_task(
+        send_emails.name,
+        args=(emails,),
+        exchange=settings.CELERY_BROKER_DLX_EXCHANGE,
+        routing_key=(
+            f"{settings.CELERY_BROKER_DLX_PREFIX}.{settings.CELERY_EMAIL_QUEUE}"
+        ),
+    )
+
+
+def queue_emails(emails: List[QueuedEmail], batch_size: Optional[int] = None):
+    """Enqueue emails onto the email queue in batches"""
+    batch_size = batch_size or settings.EMAIL_BATCH_SIZE
+    for start in range(0, len(emails), batch_size):
+        send_emails.delay(emails[start : start + batch_size])
+
+
+def queue_email(email: QueuedEmail):
+    """
+    Buffer an email in Redis until the next drain, which sends everything
+    buffered in batches. The first email buffered schedules the drain.
+    Without Redis the email is queued on its own.
+    """
+    connection = settings.REDIS_CONNECTION_INSTANCE
+    if connection is not None:
+        try:
+            connection.rpush(PENDING_EMAILS_KEY, json.dumps(email))
+            if connection.set(DRAIN_SCHEDULED_KEY, 1, nx=True, ex=60):
+                drain_emails.apply_async(countdown=settings.EMAIL_DRAIN_DELAY)
+            return
+        except redis.RedisError as e:
+            logger.warning(f"Email not buffered: {e}")
+    queue_emails([email])
+
+
+@app.task(name="Drain Emails")
+def drain_emails() -> int:
+    """Queue the emails buffered in Redis in batches, returning their count"""
+    connection = settings.REDIS_CONNECTION_INSTANCE
+    if connection is None:
+        return 0
+
+    # Emails buffered from now on schedule another drain
+    connection.delete(DRAIN_SCHEDULED_KEY)
+    return _queue_stored_emails(connection, PENDING_EMAILS_KEY)
+
+
+def store_failed_emails(emails: List[QueuedEmail], exc: Exception):
+    """
+    Keep emails that could not be sent in Redis, so they can be requeued
+    once the email backend recovers. Without Redis they are only logged.
+    """
+    recipients = ", ".join(
+        address for email in emails for address in email["to"]
+    )
+    connection = settings.REDIS_CONNECTION_INSTANCE
+    if connection is not None:
+        try:
+            connection.rpush(
+                FAILED_EMAILS_KEY, *(json.dumps(email) for email in emails)
+            )
+            logger.error(f"Emails to {recipients} not sent, stored: {exc}")
+            return
+        except redis.RedisError as e:
+            logger.warning(f"Failed emails not stored: {e}")
+    logger.error(f"Emails to {recipients} not sent, dropped: {exc}")
+
+
+def requeue_failed_emails() -> int:
+    """Queue the emails in the failed store again, returning their count"""
+    connection = settings.REDIS_CONNECTION_INSTANCE
+    if connection is None:
+        return 0
+    return _queue_stored_emails(connection, FAILED_EMAILS_KEY)
+
+
+def _queue_stored_emails(connection, key: str) -> int:
+    pipeline = connection.pipeline()
+    pipeline.lrange(key, 0, -1)
+    pipeline.delete(key)
+    emails, _ = pipeline.execute()
+    queue_emails([json.loads(email) for email in emails])
+    return len(emails)
+
 
 @app.task(name="Send SES Email")
 def send_email_using_ses(email: SESEmail) -> bool:
@@ -62,3 +239,112 @@ def send_email_using_mailpit(email: MailPitEmail):
     except Exception as e:
         logger.exception(f"An error occurred while sending mailpit mail: {e}")
         return False
+
+
+def create_ses_template(
+    client, template_name: str, subject: str, context: Dict[str, Any], fields
+) -> str:
+    """
+    Upload the email template to SES, returning the SES template name.
+    The shared `context` is rendered in, while each of `fields` is left as
+    a `{{field}}` placeholder that SES fills per recipient, so fields must
+    only be used as text, not in template tags.
+
+    Every call gets its own SES template, so a task deleting its template
+    never affects another task sending the same email.
+    """
+    # utils.emails enqueues through this module
+    from utils.emails import get_email_template
+
+    html = get_email_template(template_name).render(
+        {**context, **{field: "{{%s}}" % field for field in fields}}
+    )
+    name = f"bulk-{uuid.uuid4().hex}"
+    client.create_template(
+        Template={"TemplateName": name, "SubjectPart": subject, "HtmlPart": html}
+    )
+    return name
+
+
+@app.task(
+    bind=True, name="Send SES Bulk Email", max_retries=settings.EMAIL_MAX_RETRIES
+)
+def send_bulk_email_using_ses(
+    self,
+    template_name: str,
+    subject: str,
+    recipients: List[BulkRecipient],
+    context: Optional[Dict[str, Any]] = None,
+) -> int:
+    """
+    Send one email template to many recipients through SES bulk templated
+    calls, at the `ses_send` rate shared by every worker. Recipients that
+    fail transiently are retried with backoff. Returns the number sent.
+    """
+    client = AWSClient("ses").get_client()
+    limiter = SendRateLimiter("ses_send")
+    fields = sorted({field for recipient in recipients for field in recipient["data"]})
+    ses_template = create_ses_template(
+        client, template_name, subject, context or {}, fields
+    )
+    try:
+        sent, unsent = _send_bulk(client, limiter, ses_template, recipients)
+    finally:
+        client.delete_template(TemplateName=ses_template)
+
+    if unsent and self.request.retries < self.max_retries:
+        raise self.retry(
+            args=(),
+            kwargs={
+                "template_name": template_name,
+                "subject": subject,
+                "recipients": unsent,
+                "context": context,
+            },
+            countdown=60 * 2**self.request.retries,
+        )
+    if unsent:
+        logger.error(f"{len(unsent)} bulk emails not sent after retries")
+
+    logger.debug(f"Sent {sent} bulk emails with {template_name}")
+    return sent
+
+
+def _send_bulk(client, limiter, ses_template, recipients):
+    """Send in bulk calls, returning the sent count and retryable recipients"""
+    # A call may not need more sends than the limiter allows at once
+    batch_size = min(SES_BULK_DESTINATIONS, limiter.num_requests)
+    sent, unsent = 0, []
+    for start in range(0, len(recipients), batch_size):
+        batch = recipients[start : start + batch_size]
+        limiter.wait_for(len(batch))
+        try:
+            response = client.send_bulk_templated_email(
+                Source=settings.DEFAULT_FROM_EMAIL,
+                Template=ses_template,
+                DefaultTemplateData="{}",
+                Destinations=[
+                    {
+                        "Destination": {"ToAddresses": [recipient["email"]]},
+                        "ReplacementTemplateData": json.dumps(recipient["data"]),
+                    }
+                    for recipient in batch
+                ],
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] not in SES_RETRYABLE_ERRORS:
+                raise
+            logger.warning(f"SES bulk send throttled, retrying the rest: {e}")
+            return sent, unsent + recipients[start:]
+
+        for recipient, status in zip(batch, response["Status"]):
+            if status["Status"] == "Success":
+                sent += 1
+            elif status["Status"] in SES_RETRYABLE_STATUSES:
+                unsent.append(recipient)
+            else:
+                logger.error(
+                    f"SES rejected {recipient['email']}: {status['Status']} "
+                    f"{status.get('Error', '')}"
+                )
+    return sent, unsent
@@ -0,0 +1,43 @@
+"""
+Tests for pooled AWS clients.
+"""
+
+import threading
+
+from utils.api.aws import client as aws_client
+from utils.api.aws.client import AWSClient
+
+
+class TestAWSClient:
+    """Test pooled AWS clients"""
+
+    def test_clients_shared_per_service_and_region(self):
+        """Test instances reuse one client per service and region"""
+        client = AWSClient("ses", "us-east-1").get_client()
+
+        assert AWSClient("ses", "us-east-1").get_client() is client
+        assert AWSClient("ses", "eu-west-1").get_client() is not client
+        assert AWSClient("s3", "us-east-1").get_client() is not client
+        assert client.meta.config.max_pool_connections == 50
+
+    def test_reset_after_fork_replaces_a_held_lock(self):
+        """Test a forked child never waits on a lock held in the parent"""
+        held = aws_client._lock
+        held.acquire()
+        aws_client._reset()
+
+        assert AWSClient("ses", "us-east-1").get_client() is not None
+        held.release()
+
+    def test_resources_kept_per_thread(self):
+        """Test resources, which are not thread-safe, are not shared"""
+        resource = AWSClient("s3", "us-east-1").get_resource()
+        other = []
+        thread = threading.Thread(
+            target=lambda: other.append(AWSClient("s3", "us-east-1").get_resource())
+        )
+        thread.start()
+        thread.join()
+
+        assert AWSClient("s3", "us-east-1").get_resource() is resource
+        assert other[0] is not resource
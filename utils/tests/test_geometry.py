@@ -0,0 +1,56 @@
+"""
+Tests for encoded polyline route geometry.
+"""
+
+import json
+
+from utils.geometry import (
+    decode_polyline,
+    encode_polyline,
+    join_polylines,
+    simplify_polyline,
+)
+
+
+class TestPolyline:
+    """Test encoded polyline route geometry"""
+
+    def test_encode_matches_reference(self):
+        """Test encoding against the reference polyline example"""
+        coordinates = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+
+        assert encode_polyline(coordinates) == "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+        assert decode_polyline("_p~iF~ps|U_ulLnnqC_mqNvxq`@") == coordinates
+
+    def test_encoded_geometry_is_much_smaller_than_json(self):
+        """Test that a dense track takes a fraction of its JSON size"""
+        coordinates = [
+            (round(42.36 - i * 0.00021, 5), round(-71.06 - i * 0.00037, 5))
+            for i in range(5000)
+        ]
+
+        encoded = encode_polyline(coordinates)
+
+        assert decode_polyline(encoded) == coordinates
+        assert len(encoded) * 5 < len(json.dumps(coordinates))
+
+    def test_simplify_keeps_corners_within_tolerance(self):
+        """Test Douglas-Peucker drops collinear points and keeps corners"""
+        coordinates = [(0.0, 0.0), (0.0, 1.0), (0.0, 2.0), (1.0, 2.0), (2.0, 2.0)]
+
+        assert simplify_polyline(coordinates, 0.1) == [
+            (0.0, 0.0),
+            (0.0, 2.0),
+            (2.0, 2.0),
+        ]
+
+    def test_join_drops_repeated_junction(self):
+        """Test that joined legs share their junction point"""
+        first = encode_polyline([(1.0, 1.0), (2.0, 2.0)])
+        second = encode_polyline([(2.0, 2.0), (3.0, 3.0)])
+
+        assert decode_polyline(join_polylines([first, second])) == [
+            (1.0, 1.0),
+            (2.0, 2.0),
+            (3.0, 3.0),
+        ]
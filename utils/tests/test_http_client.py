@@ -0,0 +1,118 @@
+"""
+Tests for the pooled provider HTTP client.
+"""
+
+import pytest
+import requests
+import responses
+from utils.api.http.client import CircuitBreaker, HTTPClient
+from utils.exceptions import ExternalRequestException
+
+
+class TestHTTPClient:
+    """Test the pooled provider HTTP client"""
+
+    url = "https://provider.test/route"
+
+    def get_client(self, **kwargs):
+        return HTTPClient("provider", backoff=0, max_backoff=0, **kwargs)
+
+    @responses.activate
+    def test_retries_transient_failures(self):
+        """Test that a 503 is retried until the provider recovers"""
+        responses.get(self.url, status=503)
+        responses.get(self.url, json={"ok": True})
+        client = self.get_client()
+
+        response = client.get(self.url)
+
+        assert response.json() == {"ok": True}
+        assert client.metrics.snapshot()["calls"] == 2
+
+    @responses.activate
+    def test_open_circuit_fails_fast(self):
+        """Test that repeated failures stop further provider calls"""
+        responses.get(self.url, status=500)
+        client = self.get_client(max_retries=0, failure_threshold=2)
+
+        for _ in range(2):
+            with pytest.raises(ExternalRequestException):
+                client.get(self.url)
+        with pytest.raises(ExternalRequestException):
+            client.get(self.url)
+
+        assert len(responses.calls) == 2
+        assert client.metrics.snapshot()["rejections"] == 1
+
+    def test_circuit_allows_single_trial_after_timeout(self):
+        """Test that a half-open circuit lets one trial call through"""
+        circuit = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        circuit.record_failure()
+
+        assert circuit.allow_request()
+        assert not circuit.allow_request()
+        circuit.record_success()
+        assert not circuit.is_open
+
+    def get_half_open_client(self):
+        client = self.get_client(
+            max_retries=0, failure_threshold=1, reset_timeout=0
+        )
+        client.circuit.record_failure()
+        return client
+
+    @responses.activate
+    def test_overloaded_trial_does_not_block_the_circuit(self, mocker):
+        """Test a trial that finds no call slot lets the next trial through"""
+        responses.get(self.url, json={"ok": True})
+        client = self.get_half_open_client()
+        mocker.patch.object(client.semaphore, "acquire", return_value=False)
+
+        with pytest.raises(ExternalRequestException, match="overloaded"):
+            client.get(self.url)
+        mocker.stopall()
+
+        assert client.get(self.url).json() == {"ok": True}
+        assert not client.circuit.is_open
+
+    @responses.activate
+    def test_unexpected_request_error_fails_the_trial(self):
+        """Test errors that are not retried still reopen the circuit"""
+        responses.get(self.url, body=requests.TooManyRedirects())
+        client = self.get_half_open_client()
+
+        with pytest.raises(ExternalRequestException):
+            client.get(self.url)
+
+        assert client.circuit.is_open
+        assert not client.circuit.trial_in_progress
+
+    @responses.activate
+    def test_post_not_retried_unless_asked(self):
+        """Test a POST, which may not be idempotent, is sent only once"""
+        responses.post(self.url, status=503)
+        responses.post(self.url, json={"ok": True})
+        client = self.get_client()
+
+        with pytest.raises(ExternalRequestException):
+            client.post(self.url)
+        assert len(responses.calls) == 1
+
+        assert client.post(self.url, retry=True).json() == {"ok": True}
+        assert len(responses.calls) == 2
+
+    @responses.activate
+    def test_get_not_retried_when_opted_out(self):
+        """Test retries can be turned off for a single call"""
+        responses.get(self.url, status=503)
+        client = self.get_client()
+
+        with pytest.raises(ExternalRequestException):
+            client.get(self.url, retry=False)
+        assert len(responses.calls) == 1
+
+    def test_shared_client_per_provider(self):
+        """Test that a provider's client is created once per process"""
+        assert HTTPClient.for_provider("shared") is HTTPClient.for_provider(
+            "shared"
+        )
@@ -0,0 +1,71 @@
+"""
+Tests for coalescing of identical in-flight calls.
+"""
+
+import json
+import threading
+import time
+
+import pytest
+import redis
+from utils.singleflight import SingleFlight
+
+
+class TestSingleFlight:
+    """Test coalescing of identical in-flight calls"""
+
+    def test_concurrent_calls_share_one_execution(self):
+        """Test that concurrent callers with one key run the call once"""
+        flight = SingleFlight("test")
+        calls = []
+        results = []
+
+        def fetch():
+            calls.append(1)
+            time.sleep(0.1)
+            return {"distance": 500.0}
+
+        threads = [
+            threading.Thread(target=lambda: results.append(flight.do("lane", fetch)))
+            for _ in range(10)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 1
+        assert results == [{"distance": 500.0}] * 10
+
+    def test_errors_are_shared_and_not_cached(self):
+        """Test that a failed call raises for its caller and is retried later"""
+        flight = SingleFlight("test")
+
+        def fail():
+            raise ValueError("provider down")
+
+        with pytest.raises(ValueError):
+            flight.do("lane", fail)
+        assert flight.do("lane", lambda: "ok") == "ok"
+
+    def test_reuses_result_published_by_another_process(self, settings, mocker):
+        """Test that a result published in Redis skips the call"""
+        connection = mocker.Mock()
+        connection.get.return_value = json.dumps({"distance": 300.0})
+        settings.REDIS_CONNECTION_INSTANCE = connection
+        fetch = mocker.Mock()
+
+        assert SingleFlight("test").do("lane", fetch) == {"distance": 300.0}
+        fetch.assert_not_called()
+
+    def test_result_returned_when_publishing_fails(self, settings, mocker):
+        """Test a Redis error after the call does not lose its result"""
+        connection = mocker.Mock()
+        connection.get.return_value = None
+        connection.set.side_effect = [True, redis.RedisError]
+        settings.REDIS_CONNECTION_INSTANCE = connection
+
+        result = SingleFlight("test").do("lane", lambda: {"distance": 300.0})
+
+        assert result == {"distance": 300.0}
+        connection.eval.assert_called_once()
@@ -0,0 +1,70 @@
+"""
+Tests for GCRA rate limiting.
+"""
+
+import pytest
+import redis
+from django.core.cache import cache
+from utils.throttles import BaseThrottle
+
+
+class TestBaseThrottle:
+    """Test GCRA rate limiting"""
+
+    class Throttle(BaseThrottle):
+        scope = "test"
+        rate = "2/1m"
+
+    def get_throttle(self, now):
+        cache.clear()
+        throttle = self.Throttle()
+        throttle.key = throttle.cache_format % {"scope": "test", "ident": "a"}
+        throttle.timer = lambda: now[0]
+        return throttle
+
+    def test_allows_burst_then_spaces_requests(self):
+        """Test the full rate is allowed at once, then one per interval"""
+        now = [1000.0]
+        throttle = self.get_throttle(now)
+
+        assert throttle.acquire() == 0
+        assert throttle.acquire() == 0
+        assert throttle.acquire() == pytest.approx(30)
+
+        now[0] += 30
+        assert throttle.acquire() == 0
+        assert throttle.acquire() == pytest.approx(30)
+
+    def test_uses_redis_script(self, settings, mocker):
+        """Test the check runs in Redis when a connection is configured"""
+        connection = mocker.Mock()
+        connection.register_script.return_value.return_value = 1500
+        settings.REDIS_CONNECTION_INSTANCE = connection
+        throttle = self.get_throttle([1000.0])
+
+        assert throttle.acquire() == 1.5
+        connection.register_script.return_value.assert_called_once_with(
+            keys=[throttle.key], args=[30000.0, 60000]
+        )
+
+    def test_redis_script_registered_once(self, settings, mocker):
+        """Test the script is registered once, not on every check"""
+        connection = mocker.Mock()
+        connection.register_script.return_value.return_value = 0
+        settings.REDIS_CONNECTION_INSTANCE = connection
+
+        for _ in range(3):
+            self.get_throttle([1000.0]).acquire()
+
+        connection.register_script.assert_called_once()
+        assert connection.register_script.return_value.call_count == 3
+
+    def test_falls_back_to_cache_on_redis_error(self, settings, mocker):
+        """Test Redis failures fall back to the Django cache"""
+        connection = mocker.Mock()
+        connection.register_script.return_value.side_effect = redis.RedisError
+        settings.REDIS_CONNECTION_INSTANCE = connection
+        throttle = self.get_throttle([1000.0])
+
+        assert throttle.acquire() == 0
+        assert cache.get(throttle.key) == 1030.0
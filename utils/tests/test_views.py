@@ -0,0 +1,39 @@
+"""
+Tests for the shared view utilities.
+"""
+
+import pytest
+from utils.views import has_XSS
+
+
+class TestHasXSS:
+    """Test the XSS check matches the fragments it always has"""
+
+    @pytest.mark.parametrize(
+        "value",
+        [
+            "<SCRIPT>alert(1)</script>",
+            "go to javascript:alert(1)",
+            "<img src=x onerror=alert(1)>",
+            "a onload=run()",
+            "a onclick=run()",
+            "a onmouseover=run()",
+            "a onfocus=run()",
+            "a onsubmit=run()",
+        ],
+    )
+    def test_forbidden_fragments_detected(self, value):
+        assert has_XSS({"remarks": [value]})
+
+    @pytest.mark.parametrize(
+        "value",
+        [
+            "session=abc; reason=late",
+            "Pa$$wordonerror=1",
+            "Unload=yes, onboarding done",
+            "<b>bold</b>",
+        ],
+    )
+    def test_ordinary_text_allowed(self, value):
+        """Handler names only count after a space, as they always have"""
+        assert not has_XSS({"password": value, "remarks": [value]})
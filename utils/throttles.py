@@ -1,20 +1,66 @@
+import logging
+import math
+import time
+
+import redis
+from django.conf import settings
 from rest_framework.throttling import SimpleRateThrottle
 from utils.exceptions import RateFormatException, EndpointThrottledException
 
+logger = logging.getLogger(__name__)
+
+# GCRA in one atomic step. The key holds the theoretical arrival time (TAT)
+# of the next request in milliseconds of Redis server time; a request is
+# allowed while the TAT is less than one period ahead of now.
+# Returns the milliseconds to wait, 0 when the request was allowed.
+GCRA_SCRIPT = """
+local clock = redis.call("time")
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local interval = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+
+local tat = math.max(tonumber(redis.call("get", KEYS[1])) or now, now)
+local wait = tat + interval - period - now
+if wait > 0 then
+    return math.ceil(wait)
+end
+
+redis.call("set", KEYS[1], tat + interval, "PX", math.ceil(tat + interval - now))
+return 0
+"""
+
 
 class BaseThrottle(SimpleRateThrottle):
+    """
+    Rate limit with the generic cell rate algorithm (GCRA).
+
+    Each key stores a single timestamp instead of a request history, so
+    checks are O(1) whatever the rate. With `REDIS_CONNECTION_INSTANCE`
+    configured the check runs as a Lua script, atomic across workers;
+    otherwise (or when Redis fails) it falls back to the Django cache.
+    """
+
+    # Distinct from the history lists stored by SimpleRateThrottle
+    cache_format = "throttle_gcra_%(scope)s_%(ident)s"
+
+    # GCRA_SCRIPT registered on the connection it was last used with
+    _script = (None, None)
+
     def get_cache_key(self, request, view):
-        indent = request.data.get("email")
-        if not indent:
-            if request.user.is_authenticated:
-                indent = request.user.email
-            else:
-                indent = self.get_ident()
         return self.cache_format % {
             "scope": self.scope,
-            "ident": indent.lower(),
+            "ident": self.get_identity(request).lower(),
         }
 
+    def get_identity(self, request):
+        """
+        Authenticated user id or client IP. Never reads the request body,
+        so checking the throttle does not force DRF to parse it.
+        """
+        if request.user.is_authenticated:
+            return f"user-{request.user.pk}"
+        return self.get_ident(request)
+
     def parse_rate(self, rate):
         """
         Parses the request rate string and returns a tuple of:
@@ -45,8 +91,8 @@ class BaseThrottle(SimpleRateThrottle):
         """
         Override to provide custom exception and status code when throttled.
 
-        On success raises `throttle_success`.
-        On failure calls `throttle_failure`.
+        Returns True when the request is allowed, otherwise raises
+        `EndpointThrottledException` with the time left to wait.
         """
         if self.rate is None:
             return True
@@ -55,16 +101,81 @@ class BaseThrottle(SimpleRateThrottle):
         if self.key is None:
             return True
 
-        self.history = self.cache.get(self.key, [])
-        self.now = self.timer()
-
-        # Drop any requests from the history which have now passed the
-        # throttle duration
-        while self.history and self.history[-1] <= self.now - self.duration:
-            self.history.pop()
-        if len(self.history) >= self.num_requests:
-            wait_time = int(self.wait())
+        self.wait_time = self.acquire()
+        if self.wait_time > 0:
             raise EndpointThrottledException(
-                f"please try again in {wait_time} seconds."
+                f"please try again in {math.ceil(self.wait_time)} seconds."
             )
-        return self.throttle_success() 
\ No newline at end of file
+        return True
+
+    def wait(self):
+        return self.wait_time
+
+    def acquire(self, cost=1):
+        """
+        Record `cost` requests for `self.key` at once, returning seconds to
+        wait. `cost` may not exceed the rate's number of requests.
+        """
+        connection = settings.REDIS_CONNECTION_INSTANCE
+        if connection is not None:
+            try:
+                period_ms = self.duration * 1000
+                wait_ms = self._get_script(connection)(
+                    keys=[self.key],
+                    args=[period_ms / self.num_requests * cost, period_ms],
+                )
+                return int(wait_ms) / 1000
+            except redis.RedisError as e:
+                logger.warning(f"Throttle {self.scope} skipped Redis: {e}")
+        return self._acquire_from_cache(cost)
+
+    @classmethod
+    def _get_script(cls, connection):
+        """GCRA_SCRIPT for `connection`, registered once and then reused"""
+        registered_on, script = BaseThrottle._script
+        if registered_on is not connection:
+            script = connection.register_script(GCRA_SCRIPT)
+            BaseThrottle._script = (connection, script)
+        return script
+
+    def _acquire_from_cache(self, cost=1):
+        """GCRA on the Django cache; not atomic across workers"""
+        interval = self.duration / self.num_requests * cost
+        now = self.timer()
+        tat = max(self.cache.get(self.key, now), now)
+        wait = tat + interval - self.duration - now
+        if wait > 0:
+            return wait
+
+        self.cache.set(self.key, tat + interval, math.ceil(tat + interval - now))
+        return 0
+
+
+class EmailThrottle(BaseThrottle):
+    """
+    Throttle keyed by the email in the request body, for flows such as
+    password resets where the caller is anonymous.
+    """
+
+    def get_identity(self, request):
+        return request.data.get("email") or super().get_identity(request)
+
+
+class SendRateLimiter(BaseThrottle):
+    """
+    Rate shared by every worker for calls made outside of a request, such
+    as sends through an email provider. The rate is the scope's entry in
+    `DEFAULT_THROTTLE_RATES`.
+    """
+
+    def __init__(self, scope):
+        self.scope = scope
+        super().__init__()
+        self.key = self.cache_format % {"scope": scope, "ident": "global"}
+
+    def wait_for(self, count=1):
+        """Block until `count` sends are allowed, reserving them at once"""
+        if count > self.num_requests:
+            raise ValueError(f"Cannot reserve {count} of {self.rate} at once")
+        while (wait := self.acquire(count)) > 0:
+            time.sleep(wait)
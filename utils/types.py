@@ -18,6 +18,18 @@ class Email(TypedDict):
     attachment: IO = None
 
 
+class QueuedEmail(TypedDict):
+    """
+    Represents a rendered email waiting in the email queue.
+    """
+
+    subject: str
+    from_email: str
+    to: List[str]
+    body: str
+    attachment: str = None
+
+
 class SESEmail(TypedDict):
     """
     Represents an AWS SES email structure.
@@ -30,6 +42,16 @@ class SESEmail(TypedDict):
     HasAttachment: bool = False
 
 
+class BulkRecipient(TypedDict):
+    """
+    Represents a recipient of a bulk email, with the values of its
+    per-recipient template fields.
+    """
+
+    email: str
+    data: Dict[str, str]
+
+
 class MailPitEmail(TypedDict):
     """
     Represents a Mailpit email structure for development.
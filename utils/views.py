@@ -1,5 +1,13 @@
+import hashlib
+import json
+import re
 from functools import wraps
+import orjson
+from django.core.files import File
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response
 from django.utils.decorators import method_decorator
+from django.utils.http import http_date
 from rest_framework.mixins import (
     CreateModelMixin,
     DestroyModelMixin,
@@ -7,44 +15,65 @@ from rest_framework.mixins import (
     RetrieveModelMixin,
     UpdateModelMixin,
 )
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import SAFE_METHODS, AllowAny, IsAuthenticated
+from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
+from accounts.authentication import CachedJWTAuthentication
 from accounts.permissions import (
     IsEmailVerified,
 )
 from .exceptions import XSSDetectedException
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from .renderer import ResponseRenderer
 
 
-def has_XSS(data):
+# Every forbidden fragment in one pattern, matched against lowercased text
+XSS_PATTERN = re.compile(
+    r"<script| javascript:| on(?:error|load|click|mouseover|focus|submit)="
+)
 
-    data = str(data).lower()
-    FORBIDDEN_CHARS = (
-        "<script",
-        " javascript:",
-        " onerror=",
-        " onload=",
-        " onclick=",
-        " onmouseover=",
-        " onfocus=",
-        " onsubmit=",
-    )
-
-    for char in FORBIDDEN_CHARS:
-        if char in data:
-            return True
 
+def has_XSS(data):
+    """
+    Whether any string in `data` (a value, parsed JSON or a query dict,
+    whose lists hold every value of a key) contains a forbidden fragment.
+
+    Nested data is flattened to JSON in C by orjson, which is several
+    times faster than walking it in Python. JSON only adds quotes,
+    backslashes and punctuation between strings, none of which appear in
+    a fragment, so a match in the text is a match in one of the strings.
+    """
+    if isinstance(data, str):
+        text = data
+    else:
+        try:
+            text = orjson.dumps(
+                data, default=_xss_default, option=orjson.OPT_NON_STR_KEYS
+            ).decode()
+        except orjson.JSONEncodeError:
+            # e.g. integers wider than 64 bits, which orjson cannot encode
+            text = json.dumps(data, default=_xss_default)
+    text = text.lower()
+
+    # Every fragment has a "<", "=" or " javascript:", which are found in C
+    # far faster than the regex scans ordinary text
+    if "<" in text or "=" in text or " javascript:" in text:
+        return XSS_PATTERN.search(text) is not None
     return False
 
 
+def _xss_default(value):
+    if isinstance(value, File):
+        # Uploaded files are not scanned
+        return None
+    return str(value)
+
+
 def check_for_XSS(view_func):
     @wraps(view_func)
     def wrapper(request, *args, **kwargs):
-        data = request.GET or request.POST
-
-        for data_chunk in data.values():
-            if has_XSS(str(data_chunk)):
-                raise XSSDetectedException
+        # Bodies are checked once parsed, see XSSPreventionMixinViewSet
+        if has_XSS(request.GET):
+            raise XSSDetectedException
 
         response = view_func(request, *args, **kwargs)
         return response
@@ -52,10 +81,102 @@ def check_for_XSS(view_func):
     return wrapper
 
 
+class ConditionalGetMixin:
+    """
+    Answer GET requests with 304 Not Modified when the client's cached copy
+    is current. Validators are built from version stamps, so unchanged
+    resources are never serialized.
+    """
+
+    def get_etag(self, request, *stamps):
+        """Strong ETag for a representation of the given version stamps"""
+        version = repr((request.accepted_media_type, *stamps))
+        return f'"{hashlib.sha1(version.encode()).hexdigest()}"'
+
+    def get_conditional_response(self, request, etag, last_modified, build):
+        """
+        Return 304 when `etag`/`last_modified` match the request's
+        validators, otherwise the response from `build()` with them set.
+        `last_modified` may be None when only the ETag is known.
+        """
+        not_modified = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=last_modified and int(last_modified.timestamp()),
+        )
+        if not_modified is not None:
+            return not_modified
+
+        response = build()
+        response["ETag"] = etag
+        if last_modified:
+            response["Last-Modified"] = http_date(last_modified.timestamp())
+        response["Cache-Control"] = "private, no-cache"
+        return response
+
+
+class StreamingListMixin:
+    """
+    Stream JSON list responses item by item when `?stream=true` is passed.
+
+    Rows are read from a server-side cursor in `stream_chunk_size` batches
+    and each batch is sent as soon as it is encoded, so memory use does not
+    grow with the number of rows. Must come before ListModelMixin.
+    """
+
+    stream_chunk_size = 500
+
+    def list(self, request, *args, **kwargs):
+        if not self.should_stream(request):
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        return StreamingHttpResponse(
+            self.stream_list(queryset, request.accepted_renderer),
+            content_type=request.accepted_renderer.media_type,
+        )
+
+    def should_stream(self, request):
+        return request.query_params.get("stream") in ("1", "true") and isinstance(
+            request.accepted_renderer, ResponseRenderer
+        )
+
+    def stream_list(self, queryset, renderer):
+        """Yield the response envelope with the serialized rows as data"""
+        serializer_class = self.get_serializer_class()
+        context = self.get_serializer_context()
+
+        # The renderer's own envelope, split around an empty data list
+        envelope = renderer.encode(
+            renderer.get_envelope([], {"response": Response()})
+        )
+        head, _, tail = envelope.rpartition(b"[]")
+
+        yield head + b"["
+        chunk = []
+        separator = b""
+        for instance in queryset.iterator(chunk_size=self.stream_chunk_size):
+            data = serializer_class(instance, context=context).data
+            chunk.append(renderer.encode(data))
+            if len(chunk) == self.stream_chunk_size:
+                yield separator + b",".join(chunk)
+                chunk, separator = [], b","
+        if chunk:
+            yield separator + b",".join(chunk)
+        yield b"]" + tail
+
+
 @method_decorator(check_for_XSS, name="dispatch")
 class XSSPreventionMixinViewSet(GenericViewSet):
     """XXS attack prevention mixin"""
 
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # After authentication and throttling, so rejected requests are
+        # never parsed
+        if request.method not in SAFE_METHODS and has_XSS(request.data):
+            raise XSSDetectedException
+
 
 class CRUDMixinViewSet(
     ListModelMixin,
@@ -74,7 +195,7 @@ class CRUDViewSet(CRUDMixinViewSet, XSSPreventionMixinViewSet):
 class BaseAuthenticatedViewSet(XSSPreventionMixinViewSet):
 
     permission_classes = [IsEmailVerified, IsAuthenticated]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
 
 
 class PubicViewSet(XSSPreventionMixinViewSet):